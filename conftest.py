@@ -0,0 +1,28 @@
+import pytest
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    yield
+    # Миниатюры режутся в фоновом пуле: без ожидания задачи теста пишут
+    # во временный MEDIA_ROOT, пока фикстура mock_media его удаляет.
+    from posts import thumbnails
+    thumbnails.drain()
+
+
+@pytest.fixture(scope='session', autouse=True)
+def cache_directory(tmp_path_factory):
+    # Как и core.test_runner: кеш тестов не смешивается с кешем сервера.
+    from django.test import override_settings
+
+    from core.test_runner import relocate_caches
+    directory = str(tmp_path_factory.mktemp('cache'))
+    with override_settings(CACHES=relocate_caches(directory)):
+        yield directory
+
+
+@pytest.fixture(autouse=True)
+def clear_cache(cache_directory):
+    # База откатывается после каждого теста, а кеш страниц — нет.
+    from django.core.cache import cache
+    cache.clear()
@@ -0,0 +1,489 @@
+"""Бэкенды кеша.
+
+SQLiteCache — общий для процессов одного хоста кеш на SQLite.
+
+LocMemCache держит отдельную копию данных в каждом воркере, поэтому
+инвалидация в одном процессе не видна остальным. SQLiteCache хранит
+записи в одном файле (WAL-режим), не требует внешних сервисов и
+поддерживает атомарные incr/decr для счётчиков версий.
+
+Размер ограничен параметром OPTIONS['MAX_ENTRIES']: при переполнении
+удаляются просроченные записи, а затем 1/CULL_FREQUENCY записей, к
+которым дольше всего не обращались (LRU).
+
+LayeredCache — небольшой LRU в памяти процесса (L1) перед общим кешем
+(L2). Ключи раскладываются по корзинам, у каждой корзины в L2 есть
+счётчик поколения, который увеличивается при любой записи в корзину.
+Запись L1 годна, пока поколение её корзины не изменилось; поколения
+перечитываются из L2 одним запросом не чаще раза в CHECK_INTERVAL
+секунд, так что горячие чтения не ходят в L2 и ничего не распаковывают.
+Изменения из других процессов становятся видны не позже чем через
+CHECK_INTERVAL. Раз в STATS_INTERVAL секунд (0 — никогда) процесс пишет
+в лог core.cache_backends свою долю попаданий в L1 (stats()).
+"""
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY,'
+    ' value BLOB NOT NULL,'
+    ' expires REAL,'
+    ' accessed REAL NOT NULL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+)
+
+# Отметку обращения обновляем не чаще раза в секунду, чтобы чтение
+# горячих ключей не превращалось в запись на каждом запросе.
+ACCESS_RESOLUTION = 1
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        connection = getattr(self._local, 'connection', None)
+        pid = getattr(self._local, 'pid', None)
+        if connection is None or pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @staticmethod
+    def _dumps(value):
+        # Целые числа хранятся как есть, чтобы incr выполнялся в SQL.
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _loads(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _transaction(self):
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        return db
+
+    def _fetch(self, keys, now):
+        """{ключ: (значение, срок истечения или None)}."""
+        placeholders = ','.join('?' * len(keys))
+        rows = self._db.execute(
+            f'SELECT key, value, expires, accessed FROM cache '
+            f'WHERE key IN ({placeholders}) '
+            f'AND (expires IS NULL OR expires > ?)',
+            (*keys, now),
+        ).fetchall()
+        stale = [key for key, _, _, accessed in rows
+                 if accessed < now - ACCESS_RESOLUTION]
+        if stale:
+            placeholders = ','.join('?' * len(stale))
+            self._db.execute(
+                f'UPDATE cache SET accessed = ? WHERE key IN ({placeholders})',
+                (now, *stale),
+            )
+        return {key: (self._loads(value), expires)
+                for key, value, expires, _ in rows}
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        values = self._fetch([key], time.time())
+        return values[key][0] if key in values else default
+
+    def get_many(self, keys, version=None):
+        return {key: value for key, (value, _) in
+                self.get_many_with_expiry(keys, version).items()}
+
+    def get_many_with_expiry(self, keys, version=None):
+        """{ключ: (значение, срок истечения или None)} — для LayeredCache."""
+        if not keys:
+            return {}
+        key_map = {}
+        for key in keys:
+            made_key = self.make_key(key, version=version)
+            self.validate_key(made_key)
+            key_map[made_key] = key
+        values = self._fetch(list(key_map), time.time())
+        return {key_map[key]: entry for key, entry in values.items()}
+
+    def _write(self, key, value, timeout, only_missing):
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        db = self._transaction()
+        try:
+            if only_missing:
+                db.execute(
+                    'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                    (key, now),
+                )
+                verb = 'INSERT OR IGNORE'
+            else:
+                verb = 'INSERT OR REPLACE'
+            cursor = db.execute(
+                f'{verb} INTO cache (key, value, expires, accessed) '
+                f'VALUES (?, ?, ?, ?)',
+                (key, self._dumps(value), expires, now),
+            )
+            self._cull(db, now)
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return cursor.rowcount > 0
+
+    def _cull(self, db, now):
+        count, = db.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if count <= self._max_entries:
+            return
+        db.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+        count, = db.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if count <= self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            db.execute('DELETE FROM cache')
+            return
+        db.execute(
+            'DELETE FROM cache WHERE key IN ('
+            ' SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+            (count // self._cull_frequency,),
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._write(key, value, timeout, only_missing=True)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._write(key, value, timeout, only_missing=False)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        cursor = self._db.execute(
+            'UPDATE cache SET expires = ?, accessed = ? '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), now, key, now),
+        )
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        db = self._transaction()
+        try:
+            db.execute(
+                "UPDATE cache SET value = value + ?, accessed = ? "
+                "WHERE key = ? AND typeof(value) = 'integer' "
+                "AND (expires IS NULL OR expires > ?)",
+                (delta, now, key, now),
+            )
+            row = db.execute(
+                'SELECT value FROM cache '
+                'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (key, now),
+            ).fetchone()
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        if row is None:
+            raise ValueError(f"Key '{key}' not found")
+        if not isinstance(row[0], int):
+            raise TypeError(f"Value of key '{key}' is not an integer")
+        return row[0]
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._db.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        row = self._db.execute(
+            'SELECT 1 FROM cache '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение переиспользуется между запросами своего потока.
+        pass
+
+
+class LayeredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l2_alias = location
+        self._buckets = options.get('BUCKETS', 64)
+        self._check_interval = options.get('CHECK_INTERVAL', 1)
+        self._l1_timeout = options.get('L1_TIMEOUT', 60)
+        self._l1 = OrderedDict()
+        self._generations = []
+        self._checked = 0
+        self._lock = threading.RLock()
+        self._stats = {'hits': 0, 'misses': 0, 'stale': 0}
+        self._stats_interval = options.get('STATS_INTERVAL', 0)
+        self._stats_logged = time.time()
+
+    @property
+    def _l2(self):
+        return caches[self._l2_alias]
+
+    def _bucket(self, key):
+        return zlib.crc32(key.encode()) % self._buckets
+
+    @staticmethod
+    def _generation_key(bucket):
+        return f'layered_generation:{bucket}'
+
+    def _refresh_generations(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._checked < self._check_interval:
+            return
+        keys = [self._generation_key(i) for i in range(self._buckets)]
+        generations = self._l2.get_many(keys)
+        missing = [key for key in keys if key not in generations]
+        if missing:
+            initial = int(time.time() * 1000)
+            for key in missing:
+                self._l2.add(key, initial, None)
+            generations.update(self._l2.get_many(missing))
+        fresh = [generations.get(key) for key in keys]
+        with self._lock:
+            if len(self._generations) == len(fresh):
+                # Параллельный _bump мог уже записать более новое поколение.
+                fresh = [max(filter(None, pair), default=None)
+                         for pair in zip(fresh, self._generations)]
+            self._generations = fresh
+            self._checked = now
+
+    def _bump(self, bucket):
+        key = self._generation_key(bucket)
+        try:
+            generation = self._l2.incr(key)
+        except ValueError:
+            self._refresh_generations(force=True)
+            return
+        with self._lock:
+            if self._generations:
+                current = self._generations[bucket] or generation
+                self._generations[bucket] = max(current, generation)
+
+    def _l1_expires(self, backend_expires=None):
+        """Срок записи L1: не дольше L1_TIMEOUT и срока записи в L2."""
+        expires = time.time() + self._l1_timeout
+        if backend_expires is not None:
+            expires = min(expires, backend_expires)
+        return expires
+
+    def _generation(self, key):
+        with self._lock:
+            if not self._generations:
+                return None
+            return self._generations[self._bucket(key)]
+
+    def _remember(self, key, value, expires, generation):
+        """Кладёт в L1 значение, прочитанное из L2 при поколении generation.
+
+        Поколение берётся до чтения L2: если корзину успели изменить,
+        запись сразу окажется устаревшей, а не закрепит старое значение.
+        """
+        if generation is None:
+            return
+        with self._lock:
+            self._l1[key] = (value, generation, expires)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self._max_entries:
+                self._l1.popitem(last=False)
+
+    def _forget(self, key):
+        with self._lock:
+            self._l1.pop(key, None)
+
+    def _lookup(self, key):
+        """Значение из L1 или None, если его там нет или оно устарело."""
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            value, generation, expires = entry
+            current = self._generations[self._bucket(key)]
+            if generation != current or expires <= time.time():
+                del self._l1[key]
+                self._stats['stale'] += 1
+                return None
+            self._l1.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry
+
+    def stats(self):
+        """Счётчики попаданий L1 текущего процесса."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._l1)
+        total = stats['hits'] + stats['misses'] + stats['stale']
+        for name in ('hits', 'misses', 'stale'):
+            stats[f'{name}_rate'] = stats[name] / total if total else 0
+        return stats
+
+    def _log_stats(self):
+        """Пишет stats() в лог, если прошло STATS_INTERVAL секунд."""
+        if not self._stats_interval:
+            return
+        now = time.time()
+        with self._lock:
+            if now - self._stats_logged < self._stats_interval:
+                return
+            self._stats_logged = now
+        stats = self.stats()
+        logger.info(
+            'L1 кеша, процесс %s: попаданий %.1f%%, промахов %.1f%%, '
+            'устаревших %.1f%%, записей %s',
+            os.getpid(), stats['hits_rate'] * 100,
+            stats['misses_rate'] * 100, stats['stale_rate'] * 100,
+            stats['entries'],
+        )
+
+    def _l2_get_many(self, keys, version):
+        """{ключ: (значение, срок в L2)}; срок неизвестен — None."""
+        if hasattr(self._l2, 'get_many_with_expiry'):
+            return self._l2.get_many_with_expiry(keys, version=version)
+        return {key: (value, None) for key, value in
+                self._l2.get_many(keys, version=version).items()}
+
+    def get(self, key, default=None, version=None):
+        made_key = self.make_key(key, version=version)
+        self.validate_key(made_key)
+        self._refresh_generations()
+        self._log_stats()
+        entry = self._lookup(made_key)
+        if entry is not None:
+            return entry[0]
+        generation = self._generation(made_key)
+        values = self._l2_get_many([key], version)
+        if key not in values:
+            return default
+        value, expires = values[key]
+        self._remember(made_key, value, self._l1_expires(expires),
+                       generation)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._refresh_generations()
+        self._log_stats()
+        found = {}
+        missing = []
+        for key in keys:
+            made_key = self.make_key(key, version=version)
+            self.validate_key(made_key)
+            entry = self._lookup(made_key)
+            if entry is None:
+                missing.append(key)
+            else:
+                found[key] = entry[0]
+        if missing:
+            generations = {
+                key: self._generation(self.make_key(key, version=version))
+                for key in missing
+            }
+            values = self._l2_get_many(missing, version)
+            for key, (value, expires) in values.items():
+                self._remember(self.make_key(key, version=version), value,
+                               self._l1_expires(expires), generations[key])
+                found[key] = value
+        return found
+
+    # Записи не кладут значение в L1: при параллельной записи того же
+    # ключа в L2 могло остаться чужое значение. Его прочитает get().
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        made_key = self.make_key(key, version=version)
+        self.validate_key(made_key)
+        added = self._l2.add(key, value, timeout, version=version)
+        if added:
+            # В других процессах в L1 могло остаться значение, уже
+            # истёкшее в L2.
+            self._forget(made_key)
+            self._refresh_generations()
+            self._bump(self._bucket(made_key))
+        return added
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        made_key = self.make_key(key, version=version)
+        self.validate_key(made_key)
+        self._forget(made_key)
+        self._l2.set(key, value, timeout, version=version)
+        self._refresh_generations()
+        self._bump(self._bucket(made_key))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        made_key = self.make_key(key, version=version)
+        self.validate_key(made_key)
+        self._forget(made_key)
+        self._bump(self._bucket(made_key))
+        return self._l2.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        made_key = self.make_key(key, version=version)
+        self.validate_key(made_key)
+        self._forget(made_key)
+        value = self._l2.incr(key, delta, version=version)
+        self._bump(self._bucket(made_key))
+        return value
+
+    def delete(self, key, version=None):
+        made_key = self.make_key(key, version=version)
+        self.validate_key(made_key)
+        self._forget(made_key)
+        self._l2.delete(key, version=version)
+        self._bump(self._bucket(made_key))
+
+    def has_key(self, key, version=None):
+        return self.get(key, self, version=version) is not self
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+            self._generations = []
+        self._l2.clear()
+        self._refresh_generations(force=True)
@@ -0,0 +1,86 @@
+"""Тегированная инвалидация кеша поверх настроенного CACHES.
+
+У каждого тега (например, ``post:1`` или ``feed:index``) в кеше хранится
+номер версии. Записи и фрагменты кладут версии своих тегов в ключ, а
+invalidate_tags увеличивает версии, поэтому устаревают ровно те записи,
+которые зависели от изменившихся тегов. Рядом с версией хранится время
+последней инвалидации тега — из него берётся Last-Modified страниц.
+Старые записи вытесняются бэкендом по таймауту.
+
+Время хранится в целых секундах, как в заголовке, и каждая
+инвалидация сдвигает его хотя бы на секунду вперёд: иначе изменение в
+ту же секунду не меняло бы Last-Modified, и клиент с одним
+If-Modified-Since получил бы 304 с устаревшей страницей.
+"""
+import math
+import time
+
+from django.core.cache import cache
+
+
+def _key(tag):
+    return f'cache_tag:{tag}'
+
+
+def _time_key(tag):
+    return f'cache_tag_time:{tag}'
+
+
+def _flatten(tags):
+    for tag in tags:
+        if isinstance(tag, (list, tuple)):
+            yield from _flatten(tag)
+        else:
+            yield str(tag)
+
+
+def tag_versions(tags):
+    """Версии тегов; отсутствующие заводятся заново."""
+    keys = [_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        # Начальная версия берётся из времени, чтобы после вытеснения
+        # ключа не воскресить записи со старым номером.
+        now = time.time()
+        initial = int(now * 1000)
+        for key in missing:
+            cache.add(key, initial, None)
+        for tag, key in zip(tags, keys):
+            if key in missing:
+                cache.add(_time_key(tag), math.ceil(now), None)
+        versions.update(cache.get_many(missing))
+    return [versions[key] for key in keys]
+
+
+def tags_version(*tags):
+    """Строка с версиями тегов для ключа кеша или фрагмента."""
+    tags = list(_flatten(tags))
+    return '.'.join(str(version) for version in tag_versions(tags))
+
+
+def tags_last_modified(tags):
+    """Время последней инвалидации тегов или None, если оно неизвестно.
+
+    В отличие от дат в базе, это время не уходит назад, когда пост
+    удаляют, и меняется от всего, что сбрасывает теги.
+    """
+    tags = list(_flatten(tags))
+    times = cache.get_many([_time_key(tag) for tag in tags])
+    if not tags or len(times) < len(tags):
+        return None
+    return max(times.values())
+
+
+def invalidate_tags(*tags):
+    tags = list(_flatten(tags))
+    for tag in tags:
+        try:
+            cache.incr(_key(tag))
+        except ValueError:
+            pass
+    now = math.ceil(time.time())
+    keys = [_time_key(tag) for tag in tags]
+    previous = cache.get_many(keys)
+    cache.set_many({key: max(now, previous.get(key, 0) + 1)
+                    for key in keys}, None)
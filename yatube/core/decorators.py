@@ -0,0 +1,40 @@
+import hashlib
+from datetime import datetime, timezone
+
+from django.views.decorators.http import condition
+
+from .cache_tags import tags_last_modified, tags_version
+
+
+def tagged_condition(tags_func):
+    """Условный GET по версиям тегов кеша.
+
+    ETag собирается из адреса, пользователя и версий тегов, которые
+    возвращает tags_func(request, *args, **kwargs), а Last-Modified —
+    время последней инвалидации этих тегов, поэтому для ответа 304 не
+    нужно ни шаблонов, ни запросов к базе.
+    Если tags_func вернула None, проверка пропускается.
+    """
+    def get_tags(request, *args, **kwargs):
+        if not hasattr(request, '_tagged_tags'):
+            request._tagged_tags = tags_func(request, *args, **kwargs)
+        return request._tagged_tags
+
+    def get_etag(request, *args, **kwargs):
+        tags = get_tags(request, *args, **kwargs)
+        if tags is None:
+            return None
+        user = request.user.pk or ''
+        raw = f'{request.get_full_path()}|{user}|{tags_version(tags)}'
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def get_last_modified(request, *args, **kwargs):
+        tags = get_tags(request, *args, **kwargs)
+        if tags is None:
+            return None
+        modified = tags_last_modified(tags)
+        if modified is None:
+            return None
+        return datetime.fromtimestamp(modified, timezone.utc)
+
+    return condition(etag_func=get_etag, last_modified_func=get_last_modified)
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import time
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache_backends import SQLiteCache
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает SQLiteCache с LocMemCache и FileBasedCache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ops', type=int, default=2000,
+                            help='Число операций каждого вида.')
+        parser.add_argument('--size', type=int, default=10 * 1024,
+                            help='Размер значения в байтах.')
+
+    def handle(self, *args, **options):
+        ops = options['ops']
+        value = 'x' * options['size']
+        params = {'OPTIONS': {'MAX_ENTRIES': ops * 2}}
+        with tempfile.TemporaryDirectory() as directory:
+            backends = {
+                'locmem': LocMemCache('bench', params),
+                'filebased': FileBasedCache(
+                    os.path.join(directory, 'files'), params
+                ),
+                'sqlite': SQLiteCache(
+                    os.path.join(directory, 'cache.sqlite3'), params
+                ),
+            }
+            self.stdout.write(
+                f'{"backend":<10} {"set/s":>10} {"get/s":>10} {"incr/s":>10}'
+            )
+            for name, backend in backends.items():
+                self.stdout.write(
+                    f'{name:<10}'
+                    + ''.join(f' {rate:>10.0f}'
+                              for rate in self.measure(backend, ops, value))
+                )
+
+    def measure(self, backend, ops, value):
+        keys = [f'bench:{i}' for i in range(ops)]
+        yield self.rate(ops, lambda: [backend.set(key, value)
+                                      for key in keys])
+        yield self.rate(ops, lambda: [backend.get(key) for key in keys])
+        backend.set('bench:counter', 0)
+        yield self.rate(ops, lambda: [backend.incr('bench:counter')
+                                      for _ in keys])
+
+    @staticmethod
+    def rate(ops, run):
+        started = time.perf_counter()
+        run()
+        return ops / (time.perf_counter() - started)
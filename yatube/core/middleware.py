@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from .query_budget import QueryCounter, check_budget
+
+
+class QueryBudgetMiddleware:
+    """Сообщает о страницах, превысивших бюджет SQL-запросов.
+
+    Работает только с DEBUG: под тестами и в продакшене Django его
+    отключает. Бюджеты относятся к чтению страниц, поэтому POST и
+    другие изменяющие запросы не проверяются.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DEBUG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return self.get_response(request)
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        if request.resolver_match is not None:
+            check_budget(request.resolver_match.view_name, counter.count)
+        return response
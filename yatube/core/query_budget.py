@@ -0,0 +1,38 @@
+"""Бюджеты SQL-запросов на страницу.
+
+Бюджеты задаются в settings.QUERY_BUDGETS по имени URL
+(например, ``'posts:index': 5``) для GET-запросов и проверяются
+QueryBudgetMiddleware в разработке и тестами
+posts/tests/test_query_budgets.py.
+"""
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryCounter:
+    """Обёртка для connection.execute_wrapper, считающая запросы."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def check_budget(view_name, count):
+    budget = settings.QUERY_BUDGETS.get(view_name)
+    if budget is None or count <= budget:
+        return
+    message = (f'Страница {view_name} выполнила {count} SQL-запросов '
+               f'при бюджете {budget}')
+    if settings.QUERY_BUDGET_RAISE:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
@@ -0,0 +1,76 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, где имя файла — SHA-256 его содержимого.
+
+    Файл пишется во временный файл рядом с MEDIA_ROOT по частям и
+    одновременно хешируется, поэтому загрузка не держится в памяти
+    целиком. Одинаковое содержимое хранится один раз: повторное
+    сохранение только обновляет время изменения файла, чтобы сборщик
+    мусора не удалил его, пока новая ссылка на него не записана в базу.
+    Каталог из имени (upload_to) сохраняется, расширение — тоже:
+    posts/photo.jpg → posts/ab/cd/abcd….jpg.
+    """
+
+    chunk_size = 64 * 1024
+
+    def _save(self, name, content):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        if hasattr(content, 'temporary_file_path'):
+            temporary = content.temporary_file_path()
+            digest = self._hash_file(temporary)
+        else:
+            temporary, digest = self._write_temporary(content)
+        name = os.path.join(directory, digest[:2], digest[2:4],
+                            digest + extension)
+        full_path = self.path(name)
+        try:
+            os.utime(full_path)
+        except FileNotFoundError:
+            # Файла нет или сборщик мусора уже унёс его в корзину
+            # (posts.media.delete_original): записываем заново.
+            pass
+        else:
+            if not hasattr(content, 'temporary_file_path'):
+                os.remove(temporary)
+            return name
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        file_move_safe(temporary, full_path, allow_overwrite=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определяется содержимым в _save().
+        return name
+
+    def _hash_file(self, path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as source:
+            for chunk in iter(lambda: source.read(self.chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _write_temporary(self, content):
+        os.makedirs(self.location, exist_ok=True)
+        digest = hashlib.sha256()
+        handle, path = tempfile.mkstemp(prefix='.', suffix='.upload',
+                                        dir=self.location)
+        with os.fdopen(handle, 'wb') as destination:
+            if hasattr(content, 'seek'):
+                content.seek(0)
+            for chunk in content.chunks(self.chunk_size):
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                digest.update(chunk)
+                destination.write(chunk)
+        return path, digest.hexdigest()
@@ -0,0 +1,66 @@
+"""Single-flight пересчёт и stale-while-revalidate для кеша.
+
+Запись хранится вместе с версией и моментом, до которого она свежа, и
+живёт в кеше ещё stale_timeout секунд после этого. Когда запись
+устарела (истёк срок или сменилась версия тегов), пересчитывает её
+только запрос, захвативший блокировку, а остальные отдают устаревшую
+копию. Если устаревшей копии нет, они ждут результата не дольше
+CACHE_FILL_WAIT секунд. Если пересчёт упал, а устаревшая копия есть,
+отдаётся она (stale-if-error).
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+LOCK_TIMEOUT = 30
+POLL_INTERVAL = 0.05
+
+
+def get_or_compute(key, version, compute, timeout, stale_timeout=None):
+    if stale_timeout is None:
+        stale_timeout = settings.PAGE_CACHE_STALE_TIMEOUT
+    entry = cache.get(key)
+    if entry is not None:
+        entry_version, fresh_until, value = entry
+        if entry_version == version and fresh_until > time.time():
+            return value
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            return _recompute(key, version, compute, entry,
+                              timeout, stale_timeout)
+        finally:
+            cache.delete(lock_key)
+
+    if entry is not None:
+        return entry[2]
+    return _wait_for(key, version, compute)
+
+
+def _recompute(key, version, compute, entry, timeout, stale_timeout):
+    try:
+        value = compute()
+    except Exception:
+        if entry is None:
+            raise
+        logger.exception('Не удалось пересчитать %s, отдаём копию', key)
+        return entry[2]
+    cache.set(key, (version, time.time() + timeout, value),
+              timeout + stale_timeout)
+    return value
+
+
+def _wait_for(key, version, compute):
+    """Ждёт, пока запись пересчитает владелец блокировки."""
+    deadline = time.monotonic() + settings.CACHE_FILL_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[2]
+    return compute()
@@ -0,0 +1,54 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+from core import cache_tags, swr
+
+register = template.Library()
+
+
+@register.simple_tag
+def tags_version(*tags):
+    """{% tags_version 'feed:index' cache_tags as version %}"""
+    return cache_tags.tags_version(*tags)
+
+
+class SWRCacheNode(template.Node):
+    def __init__(self, nodelist, timeout, fragment_name, tags, vary_on):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.fragment_name = fragment_name
+        self.tags = tags
+        self.vary_on = vary_on
+
+    def render(self, context):
+        timeout = int(self.timeout.resolve(context))
+        version = cache_tags.tags_version(self.tags.resolve(context))
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        key = make_template_fragment_key(self.fragment_name, vary_on)
+        return swr.get_or_compute(
+            key, version, lambda: self.nodelist.render(context), timeout
+        )
+
+
+@register.tag('swrcache')
+def do_swrcache(parser, token):
+    """Кеширует фрагмент с тегами, single-flight и stale-while-revalidate.
+
+    {% swrcache timeout fragment_name tags [var1 var2 ...] %}
+        ...
+    {% endswrcache %}
+    """
+    nodelist = parser.parse(('endswrcache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 4:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' tag requires at least 3 arguments."
+        )
+    return SWRCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        bits[2],
+        parser.compile_filter(bits[3]),
+        [parser.compile_filter(bit) for bit in bits[4:]],
+    )
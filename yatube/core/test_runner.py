@@ -0,0 +1,58 @@
+"""Запуск тестов с отдельными файлами кеша SQLiteCache.
+
+Тесты чистят кеш (cache.clear()), поэтому работают не с cache.sqlite3
+сервера разработки, а с файлами во временном каталоге. Процессы
+--parallel, как и с тестовой базой, получают каждый свою копию.
+"""
+import copy
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import override_settings
+from django.test import runner
+
+SQLITE_BACKEND = 'core.cache_backends.SQLiteCache'
+
+_directory = None
+
+
+def relocate_caches(directory, suffix=''):
+    """Копия CACHES, в которой файлы SQLiteCache лежат в directory."""
+    caches = copy.deepcopy(settings.CACHES)
+    for params in caches.values():
+        if params['BACKEND'] == SQLITE_BACKEND:
+            name, ext = os.path.splitext(
+                os.path.basename(params['LOCATION'])
+            )
+            params['LOCATION'] = os.path.join(directory,
+                                              f'{name}{suffix}{ext}')
+    return caches
+
+
+def _init_worker(counter):
+    runner._init_worker(counter)
+    override_settings(
+        CACHES=relocate_caches(_directory, f'_{runner._worker_id}')
+    ).enable()
+
+
+class ParallelTestSuite(runner.ParallelTestSuite):
+    init_worker = _init_worker
+
+
+class TestRunner(runner.DiscoverRunner):
+    parallel_test_suite = ParallelTestSuite
+
+    def setup_test_environment(self, **kwargs):
+        global _directory
+        super().setup_test_environment(**kwargs)
+        _directory = tempfile.mkdtemp(prefix='cache-')
+        self._caches = override_settings(CACHES=relocate_caches(_directory))
+        self._caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._caches.disable()
+        shutil.rmtree(_directory, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
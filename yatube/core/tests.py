@@ -1,6 +1,22 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
 from http import HTTPStatus
+from unittest import mock
 
-from django.test import TestCase
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+
+from core.cache_backends import LayeredCache, SQLiteCache
+from core.cache_tags import (invalidate_tags, tags_last_modified,
+                             tags_version)
+from core.query_budget import QueryBudgetExceeded
+from core.storage import ContentAddressedStorage
+from core.swr import get_or_compute
 
 
 class ViewTestClass(TestCase):
@@ -8,3 +24,363 @@ class ViewTestClass(TestCase):
         response = self.client.get('/unexisting_page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class CacheTagsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_version_is_stable_until_invalidated(self):
+        version = tags_version('post:1', 'feed:index')
+        self.assertEqual(version, tags_version('post:1', 'feed:index'))
+        invalidate_tags('post:2')
+        self.assertEqual(version, tags_version('post:1', 'feed:index'))
+        invalidate_tags('post:1')
+        self.assertNotEqual(version, tags_version('post:1', 'feed:index'))
+
+    def test_last_modified_follows_invalidation(self):
+        tags_version('a', 'b')
+        created = tags_last_modified(['a', 'b'])
+        self.assertIsNotNone(created)
+        invalidate_tags('b')
+        changed = tags_last_modified(['a', 'b'])
+        self.assertGreater(changed, created)
+        self.assertEqual(tags_last_modified(['a']), created)
+        # Изменения в одну секунду всё равно дают разные значения.
+        invalidate_tags('b')
+        self.assertGreater(tags_last_modified(['b']), changed)
+        cache.delete('cache_tag_time:a')
+        self.assertIsNone(tags_last_modified(['a', 'b']))
+
+    def test_nested_tag_lists(self):
+        self.assertEqual(tags_version(['a', ['b']], 'c'),
+                         tags_version('a', 'b', 'c'))
+
+
+class SQLiteCacheTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.location,
+                                 {'OPTIONS': {'MAX_ENTRIES': 4}})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_tests_do_not_use_server_cache_file(self):
+        self.assertNotEqual(
+            caches['shared']._path,
+            os.path.join(settings.BASE_DIR, 'cache.sqlite3'),
+        )
+
+    def test_values_are_shared_between_instances(self):
+        self.cache.set('key', {'value': 1})
+        other = SQLiteCache(self.location, {})
+        self.assertEqual(other.get('key'), {'value': 1})
+        other.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_add_and_expiry(self):
+        self.assertTrue(self.cache.add('key', 'first'))
+        self.assertFalse(self.cache.add('key', 'second'))
+        self.assertEqual(self.cache.get('key'), 'first')
+        self.cache.set('expired', 'value', -1)
+        self.assertFalse(self.cache.has_key('expired'))
+
+    def test_incr_and_decr(self):
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter', 5), 6)
+        self.assertEqual(self.cache.decr('counter'), 5)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_least_recently_used_entries_are_culled(self):
+        for i in range(4):
+            self.cache.set(f'key{i}', i)
+        self.cache._db.execute(
+            "UPDATE cache SET accessed = 0 WHERE key LIKE '%key0'"
+        )
+        self.cache.set('key4', 4)
+        self.assertIsNone(self.cache.get('key0'))
+        self.assertEqual(self.cache.get('key4'), 4)
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'layered_l2': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'layered_l2',
+    },
+})
+class LayeredCacheTest(TestCase):
+    def make_cache(self):
+        return LayeredCache('layered_l2', {'OPTIONS': {'CHECK_INTERVAL': 0}})
+
+    def test_hot_reads_are_served_from_l1(self):
+        layered = self.make_cache()
+        layered.set('key', 'value')
+        self.assertEqual(layered.get('key'), 'value')
+        self.assertEqual(layered.get('key'), 'value')
+        self.assertEqual(layered.stats()['hits'], 1)
+
+    def test_stats_are_logged_periodically(self):
+        layered = LayeredCache('layered_l2', {'OPTIONS': {
+            'CHECK_INTERVAL': 0, 'STATS_INTERVAL': 60,
+        }})
+        layered.set('key', 'value')
+        layered.get('key')
+        layered._stats_logged -= 60
+        with self.assertLogs('core.cache_backends', 'INFO') as logs:
+            layered.get('key')
+            layered.get('key')
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('промахов 100.0%', logs.output[0])
+
+    def test_write_during_l2_read_is_not_pinned(self):
+        layered = self.make_cache()
+        layered.set('key', 'old')
+        read = layered._l2_get_many
+
+        def racing_read(keys, version):
+            values = read(keys, version)
+            # Пока шло чтение L2, другой поток записал новое значение.
+            layered.set('key', 'new')
+            return values
+
+        with mock.patch.object(layered, '_l2_get_many', racing_read):
+            self.assertEqual(layered.get('key'), 'old')
+        self.assertEqual(layered.get('key'), 'new')
+
+    def test_add_makes_other_l1_copies_stale(self):
+        first, second = self.make_cache(), self.make_cache()
+        first.set('key', 'old')
+        self.assertEqual(second.get('key'), 'old')
+        # Запись истекла в L2, но осталась в L1 второго процесса.
+        caches['layered_l2'].delete('key')
+        self.assertTrue(first.add('key', 'new'))
+        self.assertEqual(second.get('key'), 'new')
+
+    def test_writes_from_other_process_make_entry_stale(self):
+        first, second = self.make_cache(), self.make_cache()
+        first.set('key', 'old')
+        self.assertEqual(second.get('key'), 'old')
+        first.set('key', 'new')
+        self.assertEqual(second.get('key'), 'new')
+        self.assertEqual(second.stats()['stale'], 1)
+        first.delete('key')
+        self.assertIsNone(second.get('key'))
+
+    def test_incr_is_visible_everywhere(self):
+        first, second = self.make_cache(), self.make_cache()
+        first.set('counter', 1)
+        self.assertEqual(second.get('counter'), 1)
+        self.assertEqual(first.incr('counter'), 2)
+        self.assertEqual(second.get('counter'), 2)
+
+
+class LayeredCacheExpiryTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        location = os.path.join(self.directory, 'cache.sqlite3')
+        self.override = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            },
+            'layered_l2': {
+                'BACKEND': 'core.cache_backends.SQLiteCache',
+                'LOCATION': location,
+            },
+        })
+        self.override.enable()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_l1_copy_expires_with_l2(self):
+        layered = LayeredCache('layered_l2', {'OPTIONS': {
+            'CHECK_INTERVAL': 60, 'L1_TIMEOUT': 60,
+        }})
+        layered.set('key', 'value', 1)
+        self.assertEqual(layered.get('key'), 'value')
+        with mock.patch('core.cache_backends.time.time',
+                        return_value=time.time() + 2):
+            self.assertIsNone(layered.get('key'))
+
+
+class StaleWhileRevalidateTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_fresh_value_is_not_recomputed(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return 'value'
+
+        for _ in range(3):
+            self.assertEqual(get_or_compute('key', 1, compute, 60), 'value')
+        self.assertEqual(len(calls), 1)
+
+    def test_stale_copy_served_while_other_request_recomputes(self):
+        get_or_compute('key', 1, lambda: 'old', 60)
+        cache.add('key:lock', 1)
+        self.assertEqual(get_or_compute('key', 2, lambda: 'new', 60), 'old')
+        cache.delete('key:lock')
+        self.assertEqual(get_or_compute('key', 2, lambda: 'new', 60), 'new')
+
+    def test_stale_copy_served_on_error(self):
+        get_or_compute('key', 1, lambda: 'old', 60)
+
+        def broken():
+            raise RuntimeError('database is locked')
+
+        with self.assertLogs('core.swr'):
+            self.assertEqual(get_or_compute('key', 2, broken, 60), 'old')
+        with self.assertRaises(RuntimeError):
+            get_or_compute('other', 1, broken, 60)
+
+
+@override_settings(DEBUG=True, QUERY_BUDGETS={'posts:index': 0},
+                   QUERY_BUDGET_RAISE=True)
+class QueryBudgetMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(QUERY_BUDGET_RAISE=False)
+    def test_exceeded_budget_is_logged(self):
+        with self.assertLogs('core.query_budget', 'WARNING'):
+            self.client.get('/')
+
+    def test_exceeded_budget_raises(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/')
+
+    def test_only_reads_are_checked(self):
+        self.client.post('/')
+
+    @override_settings(DEBUG=False)
+    def test_disabled_without_debug(self):
+        self.client.get('/')
+
+
+class ContentAddressedStorageTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.storage = ContentAddressedStorage(location=self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_name_is_content_hash(self):
+        content = b'content' * 100_000
+        name = self.storage.save('posts/photo.JPG', ContentFile(content))
+        digest = hashlib.sha256(content).hexdigest()
+        self.assertEqual(name, f'posts/{digest[:2]}/{digest[2:4]}/'
+                               f'{digest}.jpg')
+        with self.storage.open(name) as saved:
+            self.assertEqual(saved.read(), content)
+
+    def test_same_content_is_stored_once(self):
+        first = self.storage.save('posts/a.png', ContentFile(b'same'))
+        os.utime(self.storage.path(first), (0, 0))
+        second = self.storage.save('posts/b.png', ContentFile(b'same'))
+        self.assertEqual(first, second)
+        # Повторная загрузка продлевает жизнь файла для сборщика мусора.
+        self.assertGreater(os.path.getmtime(self.storage.path(first)), 0)
+        files = [name for _, _, names in os.walk(self.directory)
+                 for name in names]
+        self.assertEqual(len(files), 1)
+
+    def test_different_content_gets_different_names(self):
+        self.assertNotEqual(
+            self.storage.save('posts/a.png', ContentFile(b'one')),
+            self.storage.save('posts/a.png', ContentFile(b'two')),
+        )
+
+
+class MediaServingTest(TestCase):
+    content = b'0123456789' * 10
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.directory)
+        self.override.enable()
+        digest = hashlib.sha256(self.content).hexdigest()
+        self.hashed = f'posts/{digest[:2]}/{digest[2:4]}/{digest}.jpg'
+        for name in (self.hashed, 'about.txt'):
+            path = os.path.join(self.directory, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(self.content)
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def get(self, name, **headers):
+        return self.client.get(f'/media/{name}', **headers)
+
+    def test_hashed_names_are_immutable(self):
+        response = self.get(self.hashed)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+        response = self.get(self.hashed, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_if_modified_since(self):
+        os.utime(os.path.join(self.directory, 'about.txt'),
+                 (1600000000.75, 1600000000.75))
+        response = self.get('about.txt')
+        response = self.get(
+            'about.txt', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    @override_settings(MEDIA_MAX_AGE=60)
+    def test_other_names_expire(self):
+        response = self.get('about.txt')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_range(self):
+        response = self.get(self.hashed, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, HTTPStatus.PARTIAL_CONTENT)
+        self.assertEqual(b''.join(response.streaming_content),
+                         self.content[10:20])
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/100')
+
+        response = self.get(self.hashed, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content),
+                         self.content[-5:])
+
+        response = self.get(self.hashed, HTTP_RANGE='bytes=200-')
+        self.assertEqual(response.status_code,
+                         HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+
+    def test_stale_if_range_returns_whole_file(self):
+        response = self.get(self.hashed, HTTP_RANGE='bytes=10-19',
+                            HTTP_IF_RANGE='"other"')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    @override_settings(MEDIA_SENDFILE='X-Accel-Redirect',
+                       MEDIA_ACCEL_PREFIX='/protected/')
+    def test_accel_redirect(self):
+        response = self.get(self.hashed)
+        self.assertEqual(response['X-Accel-Redirect'],
+                         f'/protected/{self.hashed}')
+        self.assertEqual(response.content, b'')
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_missing_and_outside_files(self):
+        for name in ('missing.jpg', 'posts', '../settings.py'):
+            with self.subTest(name=name):
+                self.assertEqual(self.get(name).status_code,
+                                 HTTPStatus.NOT_FOUND)
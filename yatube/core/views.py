@@ -1,4 +1,18 @@
+import mimetypes
+import os
+import re
+from stat import S_ISREG
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (FileResponse, Http404, HttpResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import render
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
 
 
 def page_not_found(request, exception):
@@ -15,3 +29,118 @@ def server_error(request):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
+
+
+# Имена-хеши содержимого: оригиналы ContentAddressedStorage (SHA-256)
+# и миниатюры sorl (MD5). Файл с таким именем никогда не меняется.
+HASHED_NAME_RE = re.compile(r'^[0-9a-f]{32}(?:[0-9a-f]{32})?\.\w+$')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def media_etag(name, stat):
+    if HASHED_NAME_RE.match(name):
+        return quote_etag(name.split('.')[0])
+    return quote_etag(f'{stat.st_size:x}-{int(stat.st_mtime):x}')
+
+
+def parse_range(header, size):
+    """(начало, конец) из заголовка Range; несколько диапазонов не
+    поддерживаются и дают None, как и отсутствие заголовка."""
+    match = RANGE_RE.match(header or '')
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        return max(size - int(end), 0), size - 1
+    end = min(int(end), size - 1) if end else size - 1
+    return int(start), end
+
+
+def read_range(path, start, length, chunk_size=64 * 1024):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def serve_media(request, path):
+    """Отдаёт файл из MEDIA_ROOT с ETag и заголовками кеширования.
+
+    Имена-хеши кешируются навсегда. При MEDIA_SENDFILE сам файл отдаёт
+    веб-сервер, иначе Django, в том числе по диапазонам байтов.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404
+    if not S_ISREG(stat.st_mode):
+        raise Http404
+    name = os.path.basename(full_path)
+    etag = media_etag(name, stat)
+    # Заголовок хранит целые секунды: с дробным mtime файл всегда казался
+    # бы новее If-Modified-Since, и 304 не приходил бы никогда.
+    mtime = int(stat.st_mtime)
+    last_modified = http_date(mtime)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=mtime
+    )
+    if response is None:
+        response = media_response(request, full_path, path, stat.st_size,
+                                  etag, last_modified)
+    response['ETag'] = etag
+    response['Last-Modified'] = last_modified
+    if HASHED_NAME_RE.match(name):
+        response['Cache-Control'] = IMMUTABLE
+    else:
+        response['Cache-Control'] = (
+            f'public, max-age={settings.MEDIA_MAX_AGE}'
+        )
+    return response
+
+
+def media_response(request, full_path, path, size, etag, last_modified):
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+    if settings.MEDIA_SENDFILE == 'X-Accel-Redirect':
+        # nginx сам обработает Range и отдаст файл из internal location.
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = (
+            settings.MEDIA_ACCEL_PREFIX + quote(path)
+        )
+        return response
+    if settings.MEDIA_SENDFILE == 'X-Sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+        return response
+    byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range not in (etag, last_modified):
+        # Файл изменился с тех пор, как клиент получил его часть.
+        byte_range = None
+    if byte_range is None:
+        response = FileResponse(open(full_path, 'rb'),
+                                content_type=content_type)
+    else:
+        start, end = byte_range
+        if start >= size or start > end:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            read_range(full_path, start, length),
+            status=206, content_type=content_type,
+        )
+        response['Content-Length'] = length
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Accept-Ranges'] = 'bytes'
+    return response
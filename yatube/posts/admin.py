@@ -1,17 +1,133 @@
+import datetime
+
+from django.conf import settings
 from django.contrib import admin
+from django.core.cache import cache
+from django.db.models import Min
+from django.utils import timezone
+
+from core.cache_tags import tags_version
+
+from . import search
+from .counters import index_counter
+from .feed_cache import GROUPS_TAG
+from .models import Comment, Follow, Group, Post, PostQuerySet
+from .utils import BoundedCountPaginator
+
+
+def period_start(day, kind):
+    """Первый день года, месяца или сам день для kind='day'."""
+    if kind == 'year':
+        return day.replace(month=1, day=1)
+    if kind == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_period(day, kind):
+    """Первый день периода kind, следующего за периодом с днём day."""
+    if kind == 'year':
+        return datetime.date(day.year + 1, 1, 1)
+    if kind == 'month':
+        year, month = divmod(day.year * 12 + day.month, 12)
+        return datetime.date(year, month + 1, 1)
+    return day + datetime.timedelta(days=1)
+
+
+class DateHierarchyQuerySet(PostQuerySet):
+    """Выборка списка постов в админке с дешёвым dates().
+
+    Тег date_hierarchy берёт годы, месяцы и дни из cl.queryset.dates(),
+    то есть из SELECT DISTINCT по усечённой дате всех подходящих строк.
+    Здесь каждый следующий непустой период находится через MIN(created)
+    по индексу от начала периода: запросов столько, сколько периодов.
+    """
 
-from .models import Comment, Follow, Group, Post
+    PERIODS = ('year', 'month', 'day')
+
+    def dates(self, field_name, kind, order='ASC'):
+        if kind not in self.PERIODS:
+            return super().dates(field_name, kind, order)
+        queryset = self.order_by()
+        periods = []
+        while True:
+            first = queryset.aggregate(first=Min(field_name))['first']
+            if first is None:
+                break
+            day = timezone.localtime(first).date()
+            periods.append(period_start(day, kind))
+            start = timezone.make_aware(datetime.datetime.combine(
+                next_period(day, kind), datetime.time()
+            ))
+            queryset = queryset.filter(**{f'{field_name}__gte': start})
+        return periods[::-1] if order == 'DESC' else periods
 
 
 class PostAdmin(admin.ModelAdmin):
     list_display = ('pk', 'text', 'created', 'author', 'group',)
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('created',)
+    date_hierarchy = 'created'
+    autocomplete_fields = ('author', 'group')
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return DateHierarchyQuerySet(self.model, queryset.query,
+                                     queryset._db)
+
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по полнотекстовому индексу вместо LIKE '%...%'."""
+        match = search.to_match(search_term)
+        if not match:
+            return queryset, False
+        return queryset.filter(pk__in=search.matching_ids(match)), False
+
+    def get_paginator(self, request, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True):
+        """Без фильтров число постов берётся из кешированного счётчика."""
+        counter = None if queryset.query.where else index_counter()
+        return BoundedCountPaginator(
+            queryset, per_page, counter, orphans=orphans,
+            allow_empty_first_page=allow_empty_first_page,
+        )
+
+    def is_changelist(self, request):
+        match = getattr(request, 'resolver_match', None)
+        return match is not None and match.url_name == (
+            f'{self.opts.app_label}_{self.opts.model_name}_changelist'
+        )
+
+    def get_autocomplete_fields(self, request):
+        # В списке группа редактируется обычным <select>: autocomplete
+        # запрашивал бы выбранную группу отдельно для каждой строки.
+        if self.is_changelist(request):
+            return ()
+        return super().get_autocomplete_fields(request)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(db_field, request,
+                                                     **kwargs)
+        if db_field.name == 'group' and self.is_changelist(request):
+            if not hasattr(request, '_group_choices'):
+                request._group_choices = cache.get_or_set(
+                    f'admin:group_choices:{tags_version(GROUPS_TAG)}',
+                    lambda: list(formfield.choices),
+                    settings.PAGE_CACHE_TIMEOUT,
+                )
+            formfield.choices = request._group_choices
+        return formfield
+
+
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'title', 'slug', 'posts_count')
+    search_fields = ('title', 'slug')
+
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
+admin.site.register(Group, GroupAdmin)
 admin.site.register(Follow)
 admin.site.register(Comment)
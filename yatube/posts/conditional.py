@@ -0,0 +1,44 @@
+"""Валидаторы условного GET для страниц с постами.
+
+Теги совпадают с тегами фрагментов (см. posts.feed_cache): всё, что
+сбрасывает фрагмент, меняет и ETag, и Last-Modified страницы.
+"""
+from .feed_cache import (GROUPS_TAG, INDEX_TAG, author_tag, follow_tag,
+                         following_tags, group_tag, post_tag)
+from .models import Post, User
+
+
+def index_tags(request):
+    return [INDEX_TAG, GROUPS_TAG]
+
+
+def group_tags(request, slug):
+    return [group_tag(slug)]
+
+
+def profile_tags(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    if author_id is None:
+        return None
+    tags = [author_tag(author_id), GROUPS_TAG]
+    if request.user.is_authenticated:
+        tags.append(follow_tag(request.user.pk))
+    return tags
+
+
+def post_detail_tags(request, post_id):
+    author_id = Post.objects.filter(pk=post_id).values_list(
+        'author_id', flat=True
+    ).first()
+    if author_id is None:
+        return None
+    return [post_tag(post_id), author_tag(author_id), GROUPS_TAG]
+
+
+def follow_tags(request):
+    # Список подписок читается один раз и для ETag, и для фрагмента.
+    if not hasattr(request, '_following_tags'):
+        request._following_tags = following_tags(request.user.pk)
+    return request._following_tags
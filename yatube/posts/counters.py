@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Group, Post, UserStats
+
+
+class FeedCounter:
+    """Количество постов в ленте, хранящееся в кеше.
+
+    При промахе значение берётся из count(): денормализованного счётчика
+    (posts.stats) или COUNT(*) для общей ленты. Небольшие ленты при
+    изменении сбрасываются и читаются заново.
+    Ленты крупнее FEED_COUNT_APPROXIMATE_FROM правятся через incr/decr
+    без COUNT(*): возможный дрейф исчезает с истечением таймаута.
+    """
+
+    def __init__(self, key, count):
+        self.key = f'feed_count:{key}'
+        self.count = count
+
+    def get(self):
+        count = cache.get(self.key)
+        if count is None:
+            count = self.count()
+            cache.set(self.key, count, settings.FEED_COUNT_TIMEOUT)
+        return count
+
+    def changed(self, delta):
+        count = cache.get(self.key)
+        if count is None:
+            return
+        if count < settings.FEED_COUNT_APPROXIMATE_FROM:
+            cache.delete(self.key)
+            return
+        try:
+            cache.incr(self.key, delta)
+        except ValueError:
+            pass
+
+
+def index_counter():
+    return FeedCounter('index', Post.objects.count)
+
+
+def group_counter(group_id):
+    return FeedCounter(f'group:{group_id}', lambda: (
+        Group.objects.filter(pk=group_id)
+        .values_list('posts_count', flat=True).first() or 0
+    ))
+
+
+def author_counter(author_id):
+    return FeedCounter(f'author:{author_id}', lambda: (
+        UserStats.objects.filter(user_id=author_id)
+        .values_list('posts_count', flat=True).first() or 0
+    ))
+
+
+def post_counters(post):
+    """Счётчики всех лент, в которые попадает пост."""
+    counters = [index_counter(), author_counter(post.author_id)]
+    if post.group_id:
+        counters.append(group_counter(post.group_id))
+    return counters
@@ -0,0 +1,52 @@
+"""Теги кеша страниц с постами (см. core.cache_tags)."""
+from core.cache_tags import invalidate_tags
+
+from .models import Follow, Group
+
+INDEX_TAG = 'feed:index'
+GROUPS_TAG = 'groups'
+
+
+def post_tag(post_id):
+    return f'post:{post_id}'
+
+
+def author_tag(author_id):
+    return f'author:{author_id}'
+
+
+def group_tag(slug):
+    return f'group:{slug}'
+
+
+def follow_tag(user_id):
+    return f'follow:{user_id}'
+
+
+def following_tags(user_id):
+    """Теги ленты подписок пользователя.
+
+    Лента зависит от постов авторов, на которых он подписан, поэтому
+    версионируется их тегами author: изменение поста сбрасывает один
+    тег автора, а не по тегу на каждого подписчика. follow_tag
+    меняется при подписке, отписке и пересборке ленты.
+    """
+    return [follow_tag(user_id), GROUPS_TAG] + [
+        author_tag(author_id) for author_id in
+        Follow.objects.filter(user_id=user_id)
+        .values_list('author_id', flat=True)
+    ]
+
+
+def invalidate_post(post, group_ids=()):
+    """Сбрасывает страницы, на которых виден пост."""
+    group_ids = {group_id for group_id in group_ids if group_id}
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True
+    ) if group_ids else []
+    invalidate_tags(
+        INDEX_TAG,
+        post_tag(post.pk),
+        author_tag(post.author_id),
+        [group_tag(slug) for slug in slugs],
+    )
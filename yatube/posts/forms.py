@@ -1,5 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
 
+from . import uploads
 from .models import Comment, Post
 
 
@@ -8,6 +11,18 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        """Проверяет загруженную картинку; обработка — после сохранения."""
+        image = self.cleaned_data.get('image')
+        if not isinstance(image, UploadedFile):
+            return image
+        try:
+            return uploads.check(image)
+        except uploads.ImageRejected as error:
+            raise forms.ValidationError(str(error))
+        except (OSError, Image.DecompressionBombError):
+            raise forms.ValidationError('Не удалось обработать картинку.')
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
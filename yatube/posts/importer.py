@@ -0,0 +1,401 @@
+"""Потоковый импорт постов, комментариев и подписок из JSONL или CSV.
+
+Строки читаются по одной, авторы и группы ищутся по словарям в памяти,
+записи вставляются через bulk_create пачками по batch_size, а
+chunk_size пачек составляют одну транзакцию. В ней же в таблицу
+ImportCheckpoint пишутся смещение в файле после последней строки и
+затронутые пользователи, группы и посты, так что прерванный импорт
+продолжается с того же места: файл перематывается на смещение, а не
+перечитывается с начала.
+
+bulk_create не отправляет сигналы (см. posts.signals), поэтому
+поисковый индекс дополняется в той же транзакции через
+search.index_posts(), а счётчики и ленты подписок пересчитываются в
+конце только для затронутых записей: stats.reconcile() и
+timeline.rebuild_many().
+"""
+import csv
+import json
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Max, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.cache_tags import invalidate_tags
+
+from . import search, stats, timeline
+from .feed_cache import INDEX_TAG, author_tag, follow_tag, group_tag, post_tag
+from .models import Comment, Follow, Group, ImportCheckpoint, Post
+from .utils import chunked
+
+User = get_user_model()
+
+
+class LineReader:
+    """Строки двоичного файла в UTF-8 со смещением после прочитанного."""
+
+    def __init__(self, file):
+        self.file = file
+        self.offset = file.tell()
+
+    def seek(self, offset):
+        self.file.seek(offset)
+        self.offset = offset
+
+    def __iter__(self):
+        for line in self.file:
+            self.offset += len(line)
+            yield line.decode('utf-8')
+
+
+def read_rows(file, file_format, offset=0):
+    """Пары (строка как словарь, смещение в байтах после неё).
+
+    file открыт в двоичном режиме; чтение начинается с offset, у CSV
+    заголовок всё равно берётся из начала файла. Пустые строки
+    пропускаются. Вместо нечитаемой строки JSONL возвращается None: она
+    считается пропущенной, и продолжение импорта не спотыкается о неё
+    снова.
+    """
+    lines = LineReader(file)
+    if file_format == 'csv':
+        header = next(csv.reader(lines), [])
+        if offset > lines.offset:
+            lines.seek(offset)
+        # csv.reader берёт строки по одной, поэтому после каждой записи
+        # смещение указывает ровно на её конец.
+        for values in csv.reader(lines):
+            if values:
+                yield dict(zip(header, values)), lines.offset
+        return
+    lines.seek(offset)
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield row if isinstance(row, dict) else None, lines.offset
+
+
+def parse_id(value):
+    """Целый id из файла или None; в CSV все значения — строки."""
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_created(value):
+    """Дата из файла; без неё — текущее время, без зоны — зона сайта."""
+    if not value:
+        return timezone.now()
+    created = parse_datetime(value)
+    if created is None:
+        raise ValueError(f'Неверная дата: {value}')
+    if timezone.is_naive(created):
+        created = timezone.make_aware(created)
+    return created
+
+
+def insert_dated(model, objects):
+    """bulk_create с датами created из файла; возвращает id новых записей.
+
+    bulk_create заменяет даты полей auto_now_add текущим временем, а
+    менять сам флаг поля нельзя: он общий для всех потоков процесса.
+    Поэтому даты записываются после вставки одним UPDATE на пачку.
+    SQLite не возвращает id из bulk_create: новые записи — это заданные
+    в файле id и по порядку вставки всё, что выше прежнего максимума.
+    """
+    dates = [obj.created for obj in objects]
+    explicit = {obj.pk for obj in objects if obj.pk is not None}
+    last = model.objects.aggregate(last=Max('pk'))['last'] or 0
+    model.objects.bulk_create(objects)
+    generated = iter(
+        model.objects.filter(pk__gt=last).exclude(pk__in=explicit)
+        .order_by('pk').values_list('pk', flat=True)
+    )
+    ids = [obj.pk if obj.pk is not None else next(generated, None)
+           for obj in objects]
+    field = model._meta.get_field('created')
+    dated = [(pk, date) for pk, date in zip(ids, dates) if pk is not None]
+    # По три параметра на запись: укладываемся в лимит SQLite.
+    for chunk in chunked(dated, 300):
+        model.objects.filter(pk__in=[pk for pk, _ in chunk]).update(
+            created=Case(*[When(pk=pk, then=Value(date, output_field=field))
+                           for pk, date in chunk])
+        )
+    return [pk for pk, _ in dated]
+
+
+class Checkpoint:
+    """Позиция импорта и затронутые записи в строке ImportCheckpoint."""
+
+    def __init__(self, name):
+        self.name = name
+        self.offset = 0
+        self.position = 0
+        self.authors = set()
+        self.groups = set()
+        self.followers = set()
+        self.commented = set()
+
+    def load(self):
+        record = ImportCheckpoint.objects.filter(name=self.name).first()
+        if record is None:
+            return
+        touched = json.loads(record.touched)
+        self.offset = record.offset
+        self.position = record.position
+        self.authors = set(touched['authors'])
+        self.groups = set(touched['groups'])
+        self.followers = set(touched['followers'])
+        self.commented = set(touched['commented'])
+
+    def save(self):
+        """Сохраняет точку; вызывается в транзакции импорта."""
+        ImportCheckpoint.objects.update_or_create(name=self.name, defaults={
+            'offset': self.offset,
+            'position': self.position,
+            'touched': json.dumps({
+                'authors': sorted(self.authors),
+                'groups': sorted(self.groups),
+                'followers': sorted(self.followers),
+                'commented': sorted(self.commented),
+            }),
+        })
+
+    def remove(self):
+        ImportCheckpoint.objects.filter(name=self.name).delete()
+
+
+class Importer:
+    """Общая часть импорта пачками.
+
+    Наследники задают model и build(rows) — генератор объектов model
+    или None для пропускаемых строк, по одному на строку.
+    """
+
+    model = None
+
+    def __init__(self, checkpoint, create_users=False):
+        self.checkpoint = checkpoint
+        self.create_users = create_users
+        self._users = None
+        self.skipped = 0
+
+    @property
+    def users(self):
+        if self._users is None:
+            self._users = dict(User.objects.values_list('username', 'pk'))
+        return self._users
+
+    def resolve_users(self, usernames):
+        """Заводит недостающих пользователей, если это разрешено."""
+        missing = {name for name in usernames
+                   if name and name not in self.users}
+        if not missing or not self.create_users:
+            return
+        User.objects.bulk_create(
+            [User(username=name, password=make_password(None))
+             for name in missing],
+            ignore_conflicts=True,
+        )
+        self.users.update(
+            User.objects.filter(username__in=missing)
+            .values_list('username', 'pk')
+        )
+
+    def insert(self, objects):
+        self.model.objects.bulk_create(objects)
+
+    def after_commit(self, objects):
+        """Сбрасывает кеш страниц, которые не пересчитываются в finish()."""
+
+    def import_batch(self, rows):
+        valid = [row for row in rows if row is not None]
+        self.skipped += len(rows) - len(valid)
+        rows = valid
+        objects = []
+        for row, obj in zip(rows, self.build(rows)):
+            if obj is None:
+                self.skipped += 1
+            else:
+                objects.append(obj)
+        self.insert(objects)
+        return objects
+
+
+class PostImporter(Importer):
+    """Поля: text, author (username), group (slug), created, id."""
+
+    model = Post
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+
+    def build(self, rows):
+        self.resolve_users(row.get('author') for row in rows)
+        for row in rows:
+            author_id = self.users.get(row.get('author'))
+            group = row.get('group')
+            group_id = self.groups.get(group) if group else None
+            if not row.get('text') or author_id is None or (
+                    group and group_id is None):
+                yield None
+                continue
+            try:
+                created = parse_created(row.get('created'))
+            except ValueError:
+                yield None
+                continue
+            yield Post(pk=parse_id(row.get('id')), text=row['text'],
+                       author_id=author_id, group_id=group_id,
+                       created=created)
+
+    def insert(self, objects):
+        search.index_posts(insert_dated(Post, objects))
+        self.checkpoint.authors.update(post.author_id for post in objects)
+        self.checkpoint.groups.update(
+            post.group_id for post in objects if post.group_id
+        )
+
+
+class CommentImporter(Importer):
+    """Поля: post (id поста), author (username), text, created."""
+
+    model = Comment
+
+    def build(self, rows):
+        self.resolve_users(row.get('author') for row in rows)
+        post_ids = set(Post.objects.filter(
+            pk__in={parse_id(row.get('post')) for row in rows} - {None}
+        ).values_list('pk', flat=True))
+        for row in rows:
+            author_id = self.users.get(row.get('author'))
+            post_id = parse_id(row.get('post'))
+            try:
+                created = parse_created(row.get('created'))
+            except ValueError:
+                yield None
+                continue
+            if (not row.get('text') or author_id is None
+                    or post_id not in post_ids):
+                yield None
+                continue
+            yield Comment(post_id=post_id, author_id=author_id,
+                          text=row['text'], created=created)
+
+    def insert(self, objects):
+        insert_dated(Comment, objects)
+        self.checkpoint.commented.update(
+            comment.post_id for comment in objects
+        )
+
+    def after_commit(self, objects):
+        invalidate_tags([post_tag(pk) for pk in
+                         {comment.post_id for comment in objects}])
+
+
+class FollowImporter(Importer):
+    """Поля: user и author (username); повторные подписки пропускаются."""
+
+    model = Follow
+
+    def build(self, rows):
+        self.resolve_users(
+            name for row in rows for name in (row.get('user'),
+                                              row.get('author'))
+        )
+        for row in rows:
+            user_id = self.users.get(row.get('user'))
+            author_id = self.users.get(row.get('author'))
+            if user_id is None or author_id is None or user_id == author_id:
+                yield None
+            else:
+                yield Follow(user_id=user_id, author_id=author_id)
+
+    def insert(self, objects):
+        self.model.objects.bulk_create(objects, ignore_conflicts=True)
+        self.checkpoint.followers.update(
+            follow.user_id for follow in objects
+        )
+        self.checkpoint.authors.update(
+            follow.author_id for follow in objects
+        )
+
+
+IMPORTERS = {
+    'posts': PostImporter,
+    'comments': CommentImporter,
+    'follows': FollowImporter,
+}
+
+
+def run(importer, rows, batch_size, chunk_size):
+    """Импортирует пары из read_rows(), начатого со смещения точки.
+
+    Возвращает число импортированных строк.
+    """
+    checkpoint = importer.checkpoint
+    imported = 0
+    finished = False
+    while not finished:
+        objects = []
+        with transaction.atomic():
+            for _ in range(chunk_size):
+                batch = list(islice(rows, batch_size))
+                if batch:
+                    objects.extend(importer.import_batch(
+                        [row for row, _ in batch]
+                    ))
+                    checkpoint.position += len(batch)
+                    checkpoint.offset = batch[-1][1]
+                if len(batch) < batch_size:
+                    finished = True
+                    break
+            checkpoint.save()
+        importer.after_commit(objects)
+        imported += len(objects)
+    return imported
+
+
+def finish(checkpoint):
+    """Пересчитывает производные данные затронутых импортом записей.
+
+    Возвращает число исправленных счётчиков по таблицам.
+    """
+    fixed = stats.reconcile(
+        users=checkpoint.authors | checkpoint.followers,
+        groups=checkpoint.groups,
+        posts=checkpoint.commented,
+    )
+    readers = set(checkpoint.followers)
+    for chunk in chunked(checkpoint.authors):
+        readers.update(Follow.objects.filter(
+            author_id__in=chunk
+        ).values_list('user_id', flat=True))
+    timeline.rebuild_many(readers)
+    slugs = Group.objects.filter(pk__in=checkpoint.groups).values_list(
+        'slug', flat=True
+    )
+    invalidate_tags(
+        INDEX_TAG,
+        [author_tag(pk) for pk in checkpoint.authors | checkpoint.followers],
+        [group_tag(slug) for slug in slugs],
+        [follow_tag(pk) for pk in readers],
+    )
+    # Закешированные размеры лент (см. posts.counters) устарели.
+    cache.delete_many(
+        ['feed_count:index']
+        + [f'feed_count:author:{pk}' for pk in checkpoint.authors]
+        + [f'feed_count:group:{pk}' for pk in checkpoint.groups]
+    )
+    return fixed
@@ -0,0 +1,140 @@
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from posts.models import Comment, Follow, Post
+
+SCHEMA = (
+    'CREATE TABLE posts_post ('
+    ' id INTEGER PRIMARY KEY, text TEXT, created DATETIME,'
+    ' author_id INTEGER, group_id INTEGER, image TEXT)',
+    'CREATE INDEX posts_post_author_id ON posts_post (author_id)',
+    'CREATE INDEX posts_post_group_id ON posts_post (group_id)',
+    'CREATE TABLE posts_comment ('
+    ' id INTEGER PRIMARY KEY, post_id INTEGER, author_id INTEGER,'
+    ' text TEXT, created DATETIME)',
+    'CREATE INDEX posts_comment_post_id ON posts_comment (post_id)',
+    'CREATE TABLE posts_follow ('
+    ' id INTEGER PRIMARY KEY, user_id INTEGER, author_id INTEGER)',
+    'CREATE UNIQUE INDEX unique_follow ON posts_follow (user_id, author_id)',
+    'CREATE INDEX posts_follow_author_id ON posts_follow (author_id)',
+)
+
+FEED_COLUMNS = 'id, text, created, author_id, group_id, image'
+KEYSET = ' ORDER BY created DESC, id DESC LIMIT 11'
+
+QUERIES = {
+    'index': (f'SELECT {FEED_COLUMNS} FROM posts_post' + KEYSET, ()),
+    'index deep': (
+        f'SELECT {FEED_COLUMNS} FROM posts_post '
+        'WHERE created < :created OR (created = :created AND id < :id)'
+        + KEYSET, ('created', 'id'),
+    ),
+    'group': (
+        f'SELECT {FEED_COLUMNS} FROM posts_post WHERE group_id = :group'
+        + KEYSET, ('group',),
+    ),
+    'author': (
+        f'SELECT {FEED_COLUMNS} FROM posts_post WHERE author_id = :author'
+        + KEYSET, ('author',),
+    ),
+    'comments': (
+        'SELECT id, author_id, text, created FROM posts_comment '
+        'WHERE post_id = :post ORDER BY created', ('post',),
+    ),
+    'followers': (
+        'SELECT user_id FROM posts_follow WHERE author_id = :author',
+        ('author',),
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает планы и время запросов лент до и после '
+            'составных индексов на синтетических данных.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--authors', type=int, default=10_000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            db = sqlite3.connect(os.path.join(directory, 'bench.sqlite3'))
+            for statement in SCHEMA:
+                db.execute(statement)
+            self.stdout.write('Заполнение данных...')
+            params = self.fill(db, options)
+            self.report(db, 'До индексов', params, options['repeat'])
+            for statement in self.index_sql():
+                db.execute(statement)
+            db.execute('ANALYZE')
+            self.report(db, 'После индексов', params, options['repeat'])
+            db.close()
+
+    def fill(self, db, options):
+        authors, groups = options['authors'], options['groups']
+        start = datetime(2020, 1, 1)
+        rows = (
+            (i, f'Пост {i}', (start + timedelta(seconds=i)).isoformat(' '),
+             random.randint(1, authors), random.randint(1, groups), '')
+            for i in range(1, options['posts'] + 1)
+        )
+        db.executemany(
+            'INSERT INTO posts_post '
+            '(id, text, created, author_id, group_id, image) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            rows,
+        )
+        db.executemany(
+            'INSERT INTO posts_comment (post_id, author_id, text, created) '
+            'VALUES (?, ?, ?, ?)',
+            ((random.randint(1, options['posts']),
+              random.randint(1, authors), 'Комментарий',
+              start.isoformat(' '))
+             for _ in range(options['posts'] // 10)),
+        )
+        db.executemany(
+            'INSERT OR IGNORE INTO posts_follow (user_id, author_id) '
+            'VALUES (?, ?)',
+            ((random.randint(1, authors), random.randint(1, authors))
+             for _ in range(authors * 10)),
+        )
+        db.commit()
+        middle = options['posts'] // 2
+        created, = db.execute(
+            'SELECT created FROM posts_post WHERE id = ?', (middle,)
+        ).fetchone()
+        return {'created': created, 'id': middle, 'group': 1,
+                'author': 1, 'post': middle}
+
+    @staticmethod
+    def index_sql():
+        """CREATE INDEX для индексов из Meta моделей."""
+        statements = []
+        with connection.schema_editor(collect_sql=True) as editor:
+            for model in (Post, Comment, Follow):
+                for index in model._meta.indexes:
+                    statements.append(str(index.create_sql(model, editor)))
+        return statements
+
+    def report(self, db, title, params, repeat):
+        self.stdout.write(f'\n{title}:')
+        for name, (sql, keys) in QUERIES.items():
+            values = {key: params[key] for key in keys}
+            plan = '; '.join(
+                row[-1] for row in
+                db.execute(f'EXPLAIN QUERY PLAN {sql}', values)
+            )
+            started = time.perf_counter()
+            for _ in range(repeat):
+                db.execute(sql, values).fetchall()
+            elapsed = (time.perf_counter() - started) / repeat * 1000
+            self.stdout.write(f'  {name:<11} {elapsed:9.3f} мс  {plan}')
@@ -0,0 +1,100 @@
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.search import FTS_SCHEMA, FTS_TABLE, to_match
+
+SYLLABLES = ('ка', 'ро', 'ми', 'ту', 'ле', 'на', 'по', 'си', 'да', 'вер')
+# Ранги слов в словаре: частое, среднее и редкое.
+QUERY_RANKS = ((0,), (50, 60), (2000,), (5000, 7000))
+
+
+def vocabulary(size):
+    words = []
+    for i in range(size):
+        word = ''
+        while True:
+            word += SYLLABLES[i % len(SYLLABLES)]
+            i //= len(SYLLABLES)
+            if not i:
+                break
+        words.append(word + 'ть')
+    return words
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск через LIKE и через FTS5 '
+            'на синтетических постах.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=200_000)
+        parser.add_argument('--words', type=int, default=40,
+                            help='Слов в одном посте.')
+        parser.add_argument('--vocabulary', type=int, default=20_000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            db = sqlite3.connect(os.path.join(directory, 'bench.sqlite3'))
+            db.execute('CREATE TABLE posts_post '
+                       '(id INTEGER PRIMARY KEY, text TEXT)')
+            db.execute(FTS_SCHEMA)
+            self.stdout.write('Заполнение данных...')
+            words = vocabulary(options['vocabulary'])
+            # Частоты слов по закону Ципфа, как в живых текстах.
+            weights = [1 / rank for rank in range(1, len(words) + 1)]
+            db.executemany(
+                'INSERT INTO posts_post (id, text) VALUES (?, ?)',
+                ((i, ' '.join(random.choices(words, weights,
+                                             k=options['words'])))
+                 for i in range(1, options['posts'] + 1)),
+            )
+            db.execute(f'INSERT INTO {FTS_TABLE} (rowid, text) '
+                       f'SELECT id, text FROM posts_post')
+            db.commit()
+            self.report(db, [' '.join(words[rank] for rank in ranks)
+                             for ranks in QUERY_RANKS], options['repeat'])
+            db.close()
+
+    def report(self, db, queries, repeat):
+        self.stdout.write(
+            f'{"запрос":<24} {"LIKE стр.":>10} {"LIKE count":>11} '
+            f'{"FTS5 стр.":>10} {"FTS5 count":>11}  (мс)'
+        )
+        for query in queries:
+            like_where, like_params = self.like_where(query)
+            match = [to_match(query)]
+            fts_where = f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?'
+            timings = (
+                self.measure(db, repeat, f'SELECT id {like_where} '
+                             f'ORDER BY id DESC LIMIT 10', like_params),
+                self.measure(db, repeat, f'SELECT count(*) {like_where}',
+                             like_params),
+                self.measure(db, repeat, f'SELECT rowid {fts_where} '
+                             f'ORDER BY rank LIMIT 10', match),
+                self.measure(db, repeat, f'SELECT count(*) {fts_where}',
+                             match),
+            )
+            self.stdout.write(
+                f'{query:<24} {timings[0]:>10.3f} {timings[1]:>11.3f} '
+                f'{timings[2]:>10.3f} {timings[3]:>11.3f}'
+            )
+
+    @staticmethod
+    def like_where(query):
+        """Условие, которое строит admin для search_fields = ('text',)."""
+        words = query.split()
+        where = ' AND '.join(['text LIKE ?'] * len(words))
+        return (f'FROM posts_post WHERE {where}',
+                [f'%{word}%' for word in words])
+
+    @staticmethod
+    def measure(db, repeat, sql, params):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            db.execute(sql, params).fetchall()
+        return (time.perf_counter() - started) / repeat * 1000
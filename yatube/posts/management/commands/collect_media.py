@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from posts import media
+
+
+class Command(BaseCommand):
+    help = ('Удаляет картинки без ссылок, брошенные миниатюры и временные '
+            'файлы загрузок; продолжает с места прошлого запуска.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--max-batches', type=int, default=0,
+            help='Пачек на область за запуск; 0 — обойти всё.',
+        )
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        report = media.collect(
+            options['batch_size'], options['max_batches'] or None,
+            dry_run=options['dry_run'],
+        )
+        elapsed = time.perf_counter() - started
+        total_files = total_bytes = 0
+        for area, (deleted, freed) in report.items():
+            self.stdout.write(
+                f'{area}: файлов {deleted}, {filesizeformat(freed)}'
+            )
+            total_files += deleted
+            total_bytes += freed
+        self.stdout.write(
+            f'Удалено файлов: {total_files}, освобождено '
+            f'{filesizeformat(total_bytes)} за {elapsed:.2f} с'
+        )
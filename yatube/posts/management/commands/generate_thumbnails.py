@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Заранее создаёт миниатюры для постов с картинками.'
+
+    def handle(self, *args, **options):
+        post_ids = Post.objects.exclude(image='').values_list(
+            'pk', flat=True
+        )
+        generated = 0
+        for post_id in post_ids.iterator():
+            thumbnails.generate(post_id)
+            generated += 1
+        self.stdout.write(f'Обработано постов: {generated}')
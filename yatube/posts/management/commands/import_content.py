@@ -0,0 +1,75 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import importer
+
+
+class Command(BaseCommand):
+    help = ('Импортирует посты, комментарии или подписки из JSONL или CSV '
+            'пачками; прерванный импорт продолжается с контрольной точки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(importer.IMPORTERS))
+        parser.add_argument('path')
+        parser.add_argument(
+            '--format', choices=('jsonl', 'csv'),
+            help='По умолчанию определяется по расширению файла.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Строк в одном bulk_create.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=20,
+            help='Пачек в одной транзакции.',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help=('Имя контрольной точки в базе '
+                  '(по умолчанию <kind>:<абсолютный путь>).'),
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать сначала, не глядя на контрольную точку.',
+        )
+        parser.add_argument(
+            '--create-users', action='store_true',
+            help='Заводить неизвестных авторов без пароля.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or (
+            'csv' if path.lower().endswith('.csv') else 'jsonl'
+        )
+        checkpoint = importer.Checkpoint(
+            options['checkpoint']
+            or f"{options['kind']}:{os.path.abspath(path)}"
+        )
+        if not options['restart']:
+            checkpoint.load()
+        if checkpoint.position:
+            self.stdout.write(f'Продолжение со строки {checkpoint.position}')
+        worker = importer.IMPORTERS[options['kind']](
+            checkpoint, create_users=options['create_users']
+        )
+        started = time.perf_counter()
+        try:
+            with open(path, 'rb') as file:
+                imported = importer.run(
+                    worker,
+                    importer.read_rows(file, file_format, checkpoint.offset),
+                    options['batch_size'], options['chunk_size'],
+                )
+        except OSError as error:
+            raise CommandError(error)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Импортировано: {imported}, пропущено: {worker.skipped} '
+            f'за {elapsed:.2f} с'
+        )
+        for table, fixed in importer.finish(checkpoint).items():
+            self.stdout.write(f'{table}: исправлено {fixed}')
+        checkpoint.remove()
@@ -0,0 +1,45 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from core.cache_tags import invalidate_tags
+from posts import timeline
+from posts.feed_cache import follow_tag
+from posts.models import Follow, TimelineEntry
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Чьи ленты пересобрать (по умолчанию все).'
+        )
+
+    def handle(self, *args, **options):
+        if options['usernames']:
+            user_ids = User.objects.filter(
+                username__in=options['usernames']
+            ).values_list('pk', flat=True)
+            cleared = []
+        else:
+            orphans = TimelineEntry.objects.filter(
+                user__follower__isnull=True
+            )
+            cleared = list(orphans.values_list('user_id', flat=True)
+                           .distinct())
+            orphans.delete()
+            user_ids = Follow.objects.values_list(
+                'user_id', flat=True
+            ).distinct()
+
+        rebuilt = 0
+        for user_id in user_ids.iterator():
+            timeline.rebuild(user_id)
+            # Закешированные страницы ленты собраны по старым записям.
+            invalidate_tags(follow_tag(user_id))
+            rebuilt += 1
+        invalidate_tags([follow_tag(user_id) for user_id in cleared])
+        self.stdout.write(f'Пересобрано лент: {rebuilt}')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts import stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики постов и подписок.'
+
+    def handle(self, *args, **options):
+        for table, fixed in stats.reconcile().items():
+            self.stdout.write(f'{table}: исправлено {fixed}')
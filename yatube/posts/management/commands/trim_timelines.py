@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.cache_tags import invalidate_tags
+from posts import timeline
+from posts.feed_cache import follow_tag
+
+
+class Command(BaseCommand):
+    help = ('Удаляет из лент подписок записи сверх FOLLOW_TIMELINE_SIZE; '
+            'запускается периодически.')
+
+    def handle(self, *args, **options):
+        user_ids = timeline.overgrown()
+        deleted = timeline.trim(user_ids)
+        # Дальние страницы обрезанных лент закешированы со старыми записями.
+        invalidate_tags([follow_tag(user_id) for user_id in user_ids])
+        self.stdout.write(f'Удалено записей: {deleted}')
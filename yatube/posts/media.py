@@ -0,0 +1,223 @@
+"""Ссылки постов на картинки в хранилище с адресацией по содержимому.
+
+Один файл может принадлежать нескольким постам (см.
+core.storage.ContentAddressedStorage), поэтому счётчик ссылок на него —
+число постов с этим именем картинки, и файл вместе с миниатюрами
+удаляется, только когда он обнулился. Файлы, сохранённые или повторно
+загруженные меньше MEDIA_GC_GRACE секунд назад, не удаляются: ссылка
+на них может быть ещё не записана в базу. Перед удалением оригинал
+атомарно переносится в корзину и проверяется ещё раз (см.
+delete_original).
+
+Остальное подбирает сборщик мусора (команда collect_media): он обходит
+оригиналы и каталог миниатюр sorl пачками по порядку имён, запоминая в
+кеше, где остановился, и удаляет оригиналы без ссылок, миниатюры,
+которых нет в key-value хранилище sorl, и брошенные временные файлы
+загрузок.
+"""
+import os
+import posixpath
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from sorl.thumbnail import default
+from sorl.thumbnail import delete as delete_with_thumbnails
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from .models import Post
+
+storage = Post._meta.get_field('image').storage
+
+
+def is_referenced(name):
+    return Post.objects.filter(image=name).exists()
+
+
+def is_fresh(path):
+    """Файл сохранён недавно, и на него вот-вот может появиться ссылка."""
+    try:
+        modified = os.path.getmtime(path)
+    except FileNotFoundError:
+        # Файл уже удалили: удалять нечего.
+        return True
+    return time.time() - modified < settings.MEDIA_GC_GRACE
+
+
+def file_size(file_storage, name):
+    try:
+        return file_storage.size(name)
+    except FileNotFoundError:
+        return 0
+
+
+def trash_path(name):
+    return os.path.join(storage.location,
+                        f'.{os.path.basename(name)}.trash')
+
+
+def delete_original(name):
+    """Удаляет оригинал и его миниатюры.
+
+    Возвращает освобождённые байты или None, если файл оставлен.
+    Повторная загрузка того же содержимого (ContentAddressedStorage._save)
+    может идти одновременно, поэтому файл сначала переносится в корзину:
+    после переноса _save его не найдёт и запишет заново, а если успел
+    обновить время изменения раньше, повторная проверка вернёт файл на
+    место.
+    """
+    path = storage.path(name)
+    trash = trash_path(name)
+    try:
+        os.rename(path, trash)
+    except FileNotFoundError:
+        return None
+    if is_fresh(trash) or is_referenced(name):
+        os.replace(trash, path)
+        return None
+    source = ImageFile(name, storage)
+    freed = os.path.getsize(trash)
+    for key in default.kvstore._get(source.key, identity='thumbnails') or []:
+        thumbnail = default.kvstore._get(key)
+        if thumbnail is not None:
+            freed += file_size(thumbnail.storage, thumbnail.name)
+    os.remove(trash)
+    delete_with_thumbnails(source, delete_file=False)
+    return freed
+
+
+def release(name):
+    """Удаляет картинку и её миниатюры, если на неё не ссылаются посты."""
+    if not name or is_referenced(name):
+        return False
+    try:
+        path = storage.path(name)
+    except SuspiciousFileOperation:
+        # Имя указывает за пределы хранилища: такой файл не наш.
+        return False
+    if not os.path.exists(path) or is_fresh(path):
+        return False
+    return delete_original(name) is not None
+
+
+def walk(file_storage, directory, after=()):
+    """Имена файлов каталога по порядку, строго после пути after."""
+    try:
+        directories, files = file_storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    directories = set(directories)
+    for entry in sorted(directories.union(files)):
+        name = posixpath.join(directory, entry) if directory else entry
+        parts = tuple(name.split('/'))
+        if entry in directories:
+            if parts >= after[:len(parts)]:
+                yield from walk(file_storage, name, after)
+        elif parts > after:
+            yield name
+
+
+def collect_originals(names, dry_run=False):
+    """Удаляет из пачки оригиналы без ссылок; возвращает (файлы, байты)."""
+    referenced = set(
+        Post.objects.filter(image__in=names).order_by()
+        .values_list('image', flat=True)
+    )
+    deleted = freed = 0
+    for name in names:
+        if name in referenced or is_fresh(storage.path(name)):
+            continue
+        size = (file_size(storage, name) if dry_run
+                else delete_original(name))
+        if size is not None:
+            deleted += 1
+            freed += size
+    return deleted, freed
+
+
+def collect_thumbnails(names, dry_run=False):
+    """Удаляет из пачки миниатюры, о которых не знает хранилище sorl.
+
+    Миниатюры живых оригиналов записаны в key-value хранилище (таблица
+    cached_db хранилища по умолчанию), поэтому проверка пачки — один
+    запрос по первичному ключу.
+    """
+    file_storage = default.storage
+    keys = {add_prefix(ImageFile(name, file_storage).key): name
+            for name in names}
+    tracked = set(KVStore.objects.filter(key__in=keys).values_list(
+        'key', flat=True
+    ))
+    deleted = freed = 0
+    for key, name in keys.items():
+        if key in tracked or is_fresh(file_storage.path(name)):
+            continue
+        deleted += 1
+        freed += file_size(file_storage, name)
+        if not dry_run:
+            file_storage.delete(name)
+    return deleted, freed
+
+
+def collect_uploads(names, dry_run=False):
+    """Удаляет временные файлы прерванных загрузок и остатки корзины."""
+    deleted = freed = 0
+    for name in names:
+        if is_fresh(storage.path(name)):
+            continue
+        deleted += 1
+        freed += file_size(storage, name)
+        if not dry_run:
+            storage.delete(name)
+    return deleted, freed
+
+
+def areas():
+    """(название, хранилище, каталог, функция сборки) для сборщика."""
+    upload_to = Post._meta.get_field('image').upload_to.rstrip('/')
+    return (
+        ('originals', storage, upload_to, collect_originals),
+        ('thumbnails', default.storage,
+         thumbnail_settings.THUMBNAIL_PREFIX.rstrip('/'),
+         collect_thumbnails),
+    )
+
+
+def collect(batch_size, max_batches=None, dry_run=False):
+    """Сборка мусора пачками; продолжает с места прошлого запуска.
+
+    Возвращает {область: (удалено файлов, освобождено байт)}.
+    """
+    report = {}
+    for area, file_storage, directory, collect_batch in areas():
+        cursor_key = f'media_gc:{area}'
+        after = tuple(cache.get(cursor_key, ()))
+        names = walk(file_storage, directory, after)
+        deleted = freed = batches = 0
+        while max_batches is None or batches < max_batches:
+            batch = list(islice(names, batch_size))
+            if batch:
+                batch_deleted, batch_freed = collect_batch(batch, dry_run)
+                deleted += batch_deleted
+                freed += batch_freed
+                batches += 1
+            if len(batch) < batch_size:
+                # Обход закончен: следующий запуск начнёт сначала.
+                cache.delete(cursor_key)
+                break
+            cache.set(cursor_key, batch[-1].split('/'), None)
+        report[area] = (deleted, freed)
+    try:
+        files = storage.listdir('')[1]
+    except FileNotFoundError:
+        # MEDIA_ROOT ещё не создан: загрузок не было.
+        files = []
+    uploads = [name for name in files if name.startswith('.')
+               and name.endswith(('.upload', '.trash'))]
+    report['uploads'] = collect_uploads(uploads, dry_run)
+    return report
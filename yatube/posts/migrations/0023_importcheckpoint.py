@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-17 07:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_post_image_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=1024, unique=True, verbose_name='Имя')),
+                ('offset', models.BigIntegerField(default=0, verbose_name='Смещение в файле, байт')),
+                ('position', models.PositiveIntegerField(default=0, verbose_name='Обработано строк')),
+                ('touched', models.TextField(default='{}', verbose_name='Затронутые записи')),
+            ],
+        ),
+    ]
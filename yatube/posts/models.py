@@ -1,22 +1,46 @@
+import json
+
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.db import models
 
-from core.models import CreatedModel
+from core.models import CountersModel, CreatedModel
+from core.storage import ContentAddressedStorage
 
 User = get_user_model()
 
 
-class Group(models.Model):
+class Group(CountersModel):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+
+    counter_fields = ('posts_count',)
 
     def __str__(self):
         return self.title
 
 
-class Post(CreatedModel):
+class PostQuerySet(models.QuerySet):
+    # Поля, которые выводит карточка поста в лентах.
+    FEED_FIELDS = (
+        'text', 'created', 'image', 'thumbnails',
+        'author', 'author__username',
+        'author__first_name', 'author__last_name',
+        'group', 'group__slug', 'group__title',
+    )
+
+    def for_feed(self):
+        """Посты для лент: автор и группа одним запросом, без лишних полей."""
+        return self.select_related('author', 'group').only(*self.FEED_FIELDS)
+
+    def for_detail(self):
+        """Пост для отдельной страницы вместе с автором и группой."""
+        return self.select_related('author', 'group')
+
+
+class Post(CountersModel, CreatedModel):
     text = models.TextField(
         'Текст поста',
         help_text='Текст нового поста'
@@ -39,17 +63,51 @@ class Post(CreatedModel):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
-        blank=True
+        storage=ContentAddressedStorage(),
+        blank=True,
+        db_index=True
+    )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0
+    )
+    thumbnails = models.TextField(
+        'Готовые миниатюры',
+        blank=True,
+        editable=False,
+        help_text='JSON: размер миниатюры → имя файла в хранилище'
     )
 
+    # thumbnails, как и счётчики, пишется только через update():
+    # его заполняет фоновый конвейер миниатюр (см. posts.thumbnails).
+    counter_fields = ('comments_count', 'thumbnails')
+
+    objects = PostQuerySet.as_manager()
+
     class Meta:
         ordering = ('-created',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(fields=['-created', '-id'],
+                         name='post_created_id_idx'),
+            models.Index(fields=['author', '-created', '-id'],
+                         name='post_author_created_idx'),
+            models.Index(fields=['group', '-created', '-id'],
+                         name='post_group_created_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    def get_thumbnails(self):
+        """Готовые миниатюры картинки: размер → имя файла."""
+        try:
+            thumbnails = json.loads(self.thumbnails)
+        except ValueError:
+            return {}
+        return thumbnails if isinstance(thumbnails, dict) else {}
+
 
 class Comment(CreatedModel):
     post = models.ForeignKey(
@@ -64,6 +122,12 @@ class Comment(CreatedModel):
     )
     text = models.TextField('Добавить коментарий:')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created_idx'),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -87,3 +151,59 @@ class Follow(models.Model):
             models.UniqueConstraint(fields=["user", "author"],
                                     name="unique_follow")
         ]
+        indexes = [
+            models.Index(fields=["author", "user"],
+                         name="follow_author_user_idx")
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    created = models.DateTimeField('Дата создания поста')
+
+    class Meta:
+        ordering = ('-created',)
+        constraints = [
+            models.UniqueConstraint(fields=["user", "post"],
+                                    name="unique_timeline_entry")
+        ]
+        indexes = [
+            models.Index(fields=["user", "-created", "-post"],
+                         name="timeline_user_created_idx")
+        ]
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя (см. posts.stats)."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчики', default=0)
+    following_count = models.PositiveIntegerField('Подписки', default=0)
+
+
+class ImportCheckpoint(models.Model):
+    """Контрольная точка import_content (см. posts.importer).
+
+    Пишется в той же транзакции, что и импортированные строки, поэтому
+    после сбоя позиция всегда совпадает с тем, что попало в базу.
+    """
+    name = models.CharField('Имя', max_length=1024, unique=True)
+    offset = models.BigIntegerField('Смещение в файле, байт', default=0)
+    position = models.PositiveIntegerField('Обработано строк', default=0)
+    # Затронутые импортом записи в JSON: {"authors": [...], ...}.
+    touched = models.TextField('Затронутые записи', default='{}')
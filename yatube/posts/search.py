@@ -0,0 +1,109 @@
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+Текст постов дублируется в виртуальную таблицу posts_post_fts с rowid,
+равным id поста. Индекс обновляют сигналы (см. posts.signals), а
+команда rebuild_search_index пересобирает его целиком. Запрос
+пользователя превращается в MATCH по префиксам слов, результаты
+упорядочены по bm25.
+"""
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'posts_post_fts'
+FTS_SCHEMA = (f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+              f"text, tokenize='unicode61 remove_diacritics 2')")
+
+WORD_RE = re.compile(r'\w+')
+
+
+def to_match(query):
+    """Выражение MATCH: все слова запроса как префиксы."""
+    words = WORD_RE.findall(query or '')
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def matching_ids(match):
+    """Подзапрос id постов, подходящих под выражение MATCH."""
+    return RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        (match,),
+    )
+
+
+def index_post(post):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                       [post.pk])
+        cursor.execute(f'INSERT INTO {FTS_TABLE} (rowid, text) '
+                       f'VALUES (%s, %s)', [post.pk, post.text])
+
+
+def unindex_post(post_id):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                       [post_id])
+
+
+def index_posts(post_ids):
+    """Переиндексирует пачку постов одним INSERT ... SELECT."""
+    post_ids = list(post_ids)
+    if not post_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(post_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} '
+                       f'WHERE rowid IN ({placeholders})', post_ids)
+        cursor.execute(f'INSERT INTO {FTS_TABLE} (rowid, text) '
+                       f'SELECT id, text FROM posts_post '
+                       f'WHERE id IN ({placeholders})', post_ids)
+
+
+def rebuild():
+    """Пересобирает индекс по всем постам, возвращает их число."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(f'INSERT INTO {FTS_TABLE} (rowid, text) '
+                       f'SELECT id, text FROM posts_post')
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) "
+                       f"VALUES ('optimize')")
+        cursor.execute(f'SELECT count(*) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
+
+
+class SearchResults:
+    """Ранжированная выдача для Paginator.
+
+    Paginator берёт len() и срезы: число совпадений считается по индексу,
+    а срез выбирает id нужной страницы в порядке bm25 и подтягивает
+    посты одним запросом.
+    """
+
+    def __init__(self, query, posts):
+        self.match = to_match(query)
+        self.posts = posts
+
+    def count(self):
+        if not self.match:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {FTS_TABLE} '
+                           f'WHERE {FTS_TABLE} MATCH %s', [self.match])
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, page):
+        if not self.match:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY rank, rowid DESC LIMIT %s OFFSET %s',
+                [self.match, page.stop - page.start, page.start],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        posts = self.posts.in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
@@ -0,0 +1,153 @@
+import threading
+
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from core.cache_tags import invalidate_tags
+
+from . import media, search, stats, timeline
+from .counters import group_counter, post_counters
+from .feed_cache import (GROUPS_TAG, author_tag, follow_tag, group_tag,
+                         invalidate_post, post_tag)
+from .models import Comment, Follow, Group, Post
+
+
+class DeletingPosts(threading.local):
+    """Посты, удаляемые в текущем потоке (см. post_deleting)."""
+
+    def __init__(self):
+        self.ids = set()
+
+
+_deleting_posts = DeletingPosts()
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous(sender, instance, **kwargs):
+    """Запоминает прежние группу и картинку редактируемого поста."""
+    instance._previous_group_id = None
+    instance._previous_image = None
+    if instance.pk is not None:
+        instance._previous_group_id, instance._previous_image = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('group_id', 'image')
+            .first()
+        ) or (None, None)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, update_fields=None, **kwargs):
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    invalidate_post(instance, [instance.group_id, previous_group_id])
+    if created or update_fields is None or 'text' in update_fields:
+        search.index_post(instance)
+    previous_image = getattr(instance, '_previous_image', None)
+    if previous_image is not None and previous_image != instance.image.name:
+        # Миниатюры старой картинки больше не подходят.
+        Post.objects.filter(pk=instance.pk).update(thumbnails='')
+        instance.thumbnails = ''
+        transaction.on_commit(lambda: media.release(previous_image))
+    if created:
+        stats.change_user(instance.author_id, 'posts_count', 1)
+        if instance.group_id:
+            stats.change_group(instance.group_id, 1)
+        for counter in post_counters(instance):
+            counter.changed(1)
+        timeline.push_post(instance)
+        return
+    if previous_group_id != instance.group_id:
+        if previous_group_id:
+            stats.change_group(previous_group_id, -1)
+            group_counter(previous_group_id).changed(-1)
+        if instance.group_id:
+            stats.change_group(instance.group_id, 1)
+            group_counter(instance.group_id).changed(1)
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    """Отмечает пост: его комментарии удаляются каскадом вместе с ним."""
+    _deleting_posts.ids.add(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    _deleting_posts.ids.discard(instance.pk)
+    invalidate_post(instance, [instance.group_id])
+    search.unindex_post(instance.pk)
+    if instance.image:
+        name = instance.image.name
+        transaction.on_commit(lambda: media.release(name))
+    stats.change_user(instance.author_id, 'posts_count', -1)
+    if instance.group_id:
+        stats.change_group(instance.group_id, -1)
+    for counter in post_counters(instance):
+        counter.changed(-1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.change_user(instance.user_id, 'following_count', 1)
+        stats.change_user(instance.author_id, 'followers_count', 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+        invalidate_follow(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    stats.change_user(instance.user_id, 'following_count', -1)
+    stats.change_user(instance.author_id, 'followers_count', -1)
+    timeline.prune(instance.user_id, instance.author_id)
+    invalidate_follow(instance)
+
+
+def invalidate_follow(follow):
+    """Лента подписчика и профили обоих участников (счётчики подписок)."""
+    invalidate_tags(
+        follow_tag(follow.user_id),
+        author_tag(follow.user_id),
+        author_tag(follow.author_id),
+    )
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.change_comments(instance.post_id, 1)
+    # Карточки лент комментариев не показывают: сбрасывается только пост.
+    invalidate_tags(post_tag(instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    if instance.post_id in _deleting_posts.ids:
+        # Строка поста удаляется следом, а его страницу сбросит
+        # post_deleted.
+        return
+    stats.change_comments(instance.post_id, -1)
+    invalidate_tags(post_tag(instance.post_id))
+
+
+@receiver(pre_save, sender=Group)
+def remember_slug(sender, instance, **kwargs):
+    """Запоминает прежний slug редактируемой группы."""
+    instance._previous_slug = None
+    if instance.pk is not None:
+        instance._previous_slug = (
+            Group.objects.filter(pk=instance.pk)
+            .values_list('slug', flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    slugs = {instance.slug, getattr(instance, '_previous_slug', None)}
+    invalidate_tags(
+        GROUPS_TAG,
+        [group_tag(slug) for slug in slugs if slug],
+    )
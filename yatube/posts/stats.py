@@ -0,0 +1,97 @@
+"""Денормализованные счётчики: посты автора и группы, комментарии поста,
+подписчики и подписки пользователя.
+
+Счётчики меняются атомарно через F() из сигналов (posts.signals), а
+команда reconcile_counters пересчитывает их, если они разошлись.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Group, Post, UserStats
+from .utils import chunked
+
+User = get_user_model()
+
+
+def _add(queryset, field, delta):
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def change_user(user_id, field, delta):
+    stats = UserStats.objects.filter(user_id=user_id)
+    if not _add(stats, field, delta) and delta > 0:
+        UserStats.objects.get_or_create(user_id=user_id)
+        _add(stats, field, delta)
+
+
+def change_group(group_id, delta):
+    _add(Group.objects.filter(pk=group_id), 'posts_count', delta)
+
+
+def change_comments(post_id, delta):
+    _add(Post.objects.filter(pk=post_id), 'comments_count', delta)
+
+
+def _count(model, field):
+    """Подзапрос с числом строк model, ссылающихся на внешнюю запись."""
+    rows = model.objects.filter(**{field: OuterRef('pk')}).order_by()
+    return Coalesce(
+        Subquery(rows.values(field).annotate(total=Count('pk'))
+                 .values('total')),
+        0,
+    )
+
+
+def _fix(queryset, counters, pks=None):
+    """Исправляет разошедшиеся счётчики; pks ограничивает проверку."""
+    if pks is not None:
+        return sum(_fix(queryset.filter(pk__in=chunk), counters)
+                   for chunk in chunked(pks))
+    fixed = 0
+    annotations = {f'actual_{field}': expression
+                   for field, expression in counters.items()}
+    for row in queryset.annotate(**annotations).values(
+            'pk', *counters, *annotations).iterator():
+        drift = {field: row[f'actual_{field}'] for field in counters
+                 if row[field] != row[f'actual_{field}']}
+        if drift:
+            queryset.model.objects.filter(pk=row['pk']).update(**drift)
+            fixed += 1
+    return fixed
+
+
+def _create_stats(user_ids):
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=pk) for pk in user_ids], ignore_conflicts=True
+    )
+
+
+def reconcile(users=None, groups=None, posts=None):
+    """Пересчитывает счётчики; возвращает число исправленных строк.
+
+    users, groups и posts — id записей, которые нужно проверить;
+    None означает все записи таблицы.
+    """
+    missing = User.objects.filter(stats__isnull=True)
+    if users is None:
+        _create_stats(missing.values_list('pk', flat=True))
+    else:
+        for chunk in chunked(users):
+            _create_stats(missing.filter(pk__in=chunk)
+                          .values_list('pk', flat=True))
+    return {
+        'users': _fix(UserStats.objects.all(), {
+            'posts_count': _count(Post, 'author'),
+            'followers_count': _count(Follow, 'author'),
+            'following_count': _count(Follow, 'user'),
+        }, users),
+        'groups': _fix(Group.objects.all(), {
+            'posts_count': _count(Post, 'group'),
+        }, groups),
+        'posts': _fix(Post.objects.all(), {
+            'comments_count': _count(Comment, 'post'),
+        }, posts),
+    }
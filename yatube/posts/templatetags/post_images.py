@@ -0,0 +1,38 @@
+from django import template
+from django.utils.html import format_html
+
+from posts import thumbnails
+
+register = template.Library()
+
+# Карточка поста занимает всю ширину контейнера, но не больше 960px.
+DEFAULT_SIZES = '(max-width: 960px) 100vw, 960px'
+
+
+@register.simple_tag
+def post_image(post, geometry, css_class='', sizes=DEFAULT_SIZES):
+    """<img srcset sizes> из готовых вариантов картинки поста.
+
+    Если есть WebP-варианты, картинка оборачивается в <picture>. Пока
+    миниатюры не готовы, выводится оригинал.
+    """
+    if not post.image:
+        return ''
+    main = thumbnails.lookup(post, geometry)
+    if main is None:
+        return format_html('<img class="{}" src="{}" alt="">',
+                           css_class, post.image.url)
+    width, height = geometry.split('x')
+    image = format_html(
+        '<img class="{}" src="{}" srcset="{}" sizes="{}" '
+        'width="{}" height="{}" alt="">',
+        css_class, main.url, thumbnails.srcset(post, geometry), sizes,
+        width, height,
+    )
+    webp = thumbnails.srcset(post, geometry, 'WEBP')
+    if not webp:
+        return image
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '{}</picture>', webp, sizes, image,
+    )
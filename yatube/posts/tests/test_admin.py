@@ -0,0 +1,115 @@
+from datetime import datetime
+
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.admin import DateHierarchyQuerySet
+from posts.models import Group, Post
+from posts.utils import BoundedCountPaginator
+
+User = get_user_model()
+
+
+class PostAdminTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        cls.groups = [Group.objects.create(title=f'Группа {i}', slug=f'g{i}',
+                                           description='Описание')
+                      for i in range(3)]
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:posts_post_changelist')
+
+    def create_posts(self, count):
+        for i in range(count):
+            author = User.objects.create_user(
+                username=f'user{Post.objects.count()}'
+            )
+            Post.objects.create(author=author, text=f'Пост {i}',
+                                group=self.groups[i % len(self.groups)])
+
+    def changelist_queries(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in queries.captured_queries]
+
+    def test_queries_do_not_grow_with_rows(self):
+        self.create_posts(3)
+        self.changelist_queries()
+        few = self.changelist_queries()
+        self.create_posts(20)
+        self.changelist_queries()
+        many = self.changelist_queries()
+        self.assertEqual(len(few), len(many), '\n'.join(many))
+
+    def test_group_choices_are_cached(self):
+        self.create_posts(5)
+        self.changelist_queries()
+        queries = self.changelist_queries()
+        self.assertFalse([sql for sql in queries
+                          if 'FROM "posts_group"' in sql], queries)
+
+    def test_unfiltered_list_has_no_full_count(self):
+        self.create_posts(5)
+        self.changelist_queries()
+        queries = self.changelist_queries()
+        self.assertFalse([sql for sql in queries
+                          if sql.startswith('SELECT COUNT(*)')], queries)
+
+    def test_filtered_count_is_bounded(self):
+        self.create_posts(5)
+        paginator = BoundedCountPaginator(
+            Post.objects.filter(group=self.groups[0]), 1
+        )
+        paginator.max_count = 1
+        self.assertEqual(paginator.count, 1)
+        response = self.client.get(self.url,
+                                   {'created__year': Post.objects.first()
+                                    .created.year})
+        self.assertEqual(response.context['cl'].result_count, 5)
+
+    def test_change_form_uses_autocomplete(self):
+        self.create_posts(1)
+        response = self.client.get(
+            reverse('admin:posts_post_change',
+                    args=(Post.objects.first().pk,))
+        )
+        fields = response.context['adminform'].form.fields
+        for name in ('author', 'group'):
+            with self.subTest(name=name):
+                self.assertIsInstance(fields[name].widget.widget,
+                                      AutocompleteSelect)
+
+    def test_date_hierarchy_skips_distinct_scan(self):
+        self.create_posts(4)
+        for post, created in zip(Post.objects.order_by('pk'), (
+                datetime(2019, 12, 31, 23), datetime(2020, 1, 5),
+                datetime(2020, 1, 20), datetime(2020, 3, 1))):
+            Post.objects.filter(pk=post.pk).update(
+                created=timezone.make_aware(created)
+            )
+        posts = DateHierarchyQuerySet(Post)
+        for kind in ('year', 'month', 'day'):
+            with self.subTest(kind=kind):
+                self.assertEqual(posts.dates('created', kind),
+                                 list(Post.objects.dates('created', kind)))
+        for params in ({}, {'created__year': 2020},
+                       {'created__year': 2020, 'created__month': 1}):
+            with self.subTest(params=params):
+                queries = self.changelist_queries(**params)
+                self.assertFalse([sql for sql in queries
+                                  if 'DISTINCT' in sql], queries)
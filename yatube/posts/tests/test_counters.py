@@ -0,0 +1,138 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core.cache_tags import tags_version
+from posts.counters import author_counter, group_counter
+from posts.feed_cache import follow_tag
+from posts.models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+
+class FeedCounterTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.create(author=cls.user, text='Пост', group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_count_is_cached(self):
+        self.assertEqual(author_counter(self.user.pk).get(), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(author_counter(self.user.pk).get(), 1)
+
+    def test_create_and_delete_invalidate_count(self):
+        counter = group_counter(self.group.pk)
+        self.assertEqual(counter.get(), 1)
+        post = Post.objects.create(author=self.user, text='Ещё пост',
+                                   group=self.group)
+        self.assertEqual(counter.get(), 2)
+        post.delete()
+        self.assertEqual(counter.get(), 1)
+
+    def test_group_change_moves_count(self):
+        other_group = Group.objects.create(title='Другая', slug='other',
+                                           description='Описание')
+        self.assertEqual(group_counter(self.group.pk).get(), 1)
+        self.assertEqual(group_counter(other_group.pk).get(), 0)
+        post = Post.objects.get(group=self.group)
+        post.group = other_group
+        post.save()
+        self.assertEqual(group_counter(self.group.pk).get(), 0)
+        self.assertEqual(group_counter(other_group.pk).get(), 1)
+
+    @override_settings(FEED_COUNT_APPROXIMATE_FROM=1)
+    def test_large_feed_is_adjusted_without_recount(self):
+        counter = author_counter(self.user.pk)
+        self.assertEqual(counter.get(), 1)
+        Post.objects.create(author=self.user, text='Ещё пост')
+        with self.assertNumQueries(0):
+            self.assertEqual(counter.get(), 2)
+
+
+class DenormalizedCountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def test_counters_follow_changes(self):
+        post = Post.objects.create(author=self.user, text='Пост',
+                                   group=self.group)
+        Comment.objects.create(post=post, author=self.reader, text='Ок')
+        follow = Follow.objects.create(user=self.reader, author=self.user)
+        self.assertEqual(UserStats.objects.get(user=self.user).posts_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).followers_count, 1
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count, 1
+        )
+        self.assertEqual(Group.objects.get(pk=self.group.pk).posts_count, 1)
+        self.assertEqual(Post.objects.get(pk=post.pk).comments_count, 1)
+
+        follow.delete()
+        post.delete()
+        self.assertEqual(UserStats.objects.get(user=self.user).posts_count, 0)
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).followers_count, 0
+        )
+        self.assertEqual(Group.objects.get(pk=self.group.pk).posts_count, 0)
+
+    def test_cascade_skips_comment_counter(self):
+        post = Post.objects.create(author=self.user, text='Пост')
+        other = Post.objects.create(author=self.user, text='Другой')
+        for _ in range(3):
+            Comment.objects.create(post=post, author=self.reader, text='Ок')
+        Comment.objects.create(post=other, author=self.reader, text='Ок')
+        Follow.objects.create(user=self.reader, author=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            post.delete()
+        self.assertFalse([query for query in queries
+                          if 'comments_count' in query['sql']])
+        Comment.objects.filter(post=other).get().delete()
+        self.assertEqual(Post.objects.get(pk=other.pk).comments_count, 0)
+        # Комментарии не меняют карточки в ленте подписок.
+        feed_version = tags_version(follow_tag(self.reader.pk))
+        Comment.objects.create(post=other, author=self.reader, text='Ок')
+        self.assertEqual(tags_version(follow_tag(self.reader.pk)),
+                         feed_version)
+
+    def test_edit_does_not_overwrite_counters(self):
+        post = Post.objects.create(author=self.user, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Ок')
+        post.text = 'Изменённый пост'
+        post.save()
+        self.assertEqual(Post.objects.get(pk=post.pk).comments_count, 1)
+
+    def test_reconcile_fixes_drift(self):
+        post = Post.objects.create(author=self.user, text='Пост',
+                                   group=self.group)
+        Post.objects.filter(pk=post.pk).update(comments_count=5)
+        Group.objects.update(posts_count=0)
+        UserStats.objects.filter(user=self.user).delete()
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertEqual(Post.objects.get(pk=post.pk).comments_count, 0)
+        self.assertEqual(Group.objects.get(pk=self.group.pk).posts_count, 1)
+        self.assertEqual(UserStats.objects.get(user=self.user).posts_count, 1)
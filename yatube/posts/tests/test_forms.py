@@ -73,7 +73,8 @@ class PostFormTests(TestCase):
         self.assertEqual(last_post.text, form_data['text'])
         self.assertEqual(last_post.author, self.user)
         self.assertEqual(last_post.group, self.group)
-        self.assertEqual(last_post.image, f'posts/{post_image.name}')
+        self.assertRegex(last_post.image.name,
+                         r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.gif$')
 
     def test_edit_post(self):
         path = reverse(('posts:post_detail'), kwargs={'post_id': self.post.pk})
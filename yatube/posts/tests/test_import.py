@@ -0,0 +1,184 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from posts.models import (Comment, Follow, Group, ImportCheckpoint, Post,
+                          UserStats)
+from posts.search import SearchResults
+
+User = get_user_model()
+
+
+class ImportContentTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def write_jsonl(self, name, rows):
+        return self.write(name, ''.join(json.dumps(row) + '\n'
+                                        for row in rows))
+
+    def import_content(self, *args):
+        out = StringIO()
+        call_command('import_content', *args, stdout=out)
+        return out.getvalue()
+
+    def test_posts_with_derived_data(self):
+        path = self.write_jsonl('posts.jsonl', [
+            {'text': 'Импортированный пост', 'author': 'author',
+             'group': 'group', 'created': '2020-01-02T03:04:05'},
+            {'text': 'Второй пост', 'author': 'author'},
+            {'text': 'Чужой автор', 'author': 'nobody'},
+            {'text': 'Нет группы', 'author': 'author', 'group': 'missing'},
+        ])
+        out = self.import_content('posts', path, '--batch-size', '2')
+        self.assertIn('Импортировано: 2, пропущено: 2', out)
+
+        post = Post.objects.get(text='Импортированный пост')
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(post.created,
+                         timezone.make_aware(datetime(2020, 1, 2, 3, 4, 5)))
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 2
+        )
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(
+            list(SearchResults('импортированный', Post.objects.all())[0:10]),
+            [post],
+        )
+        self.assertEqual(
+            Post.objects.filter(timeline_entries__user=self.reader).count(), 2
+        )
+        self.assertFalse(ImportCheckpoint.objects.exists())
+        # Поле created после импорта снова заполняется автоматически.
+        self.assertGreater(
+            Post.objects.create(author=self.author, text='Новый').created,
+            post.created,
+        )
+
+    def test_comments_from_csv(self):
+        post = Post.objects.create(author=self.author, text='Пост')
+        path = self.write(
+            'comments.csv',
+            'post,author,text,created\n'
+            f'{post.pk},reader,Первый,2021-05-01 10:00\n'
+            f'{post.pk},reader,Второй,\n'
+            'abc,reader,Неверный пост,\n',
+        )
+        out = self.import_content('comments', path)
+        self.assertIn('Импортировано: 2, пропущено: 1', out)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 2)
+        self.assertEqual(Comment.objects.filter(post=post).count(), 2)
+
+    def test_follows_create_users(self):
+        path = self.write_jsonl('follows.jsonl', [
+            {'user': 'newcomer', 'author': 'author'},
+            {'user': 'newcomer', 'author': 'newcomer'},
+        ])
+        self.import_content('follows', path, '--create-users')
+        newcomer = User.objects.get(username='newcomer')
+        self.assertFalse(newcomer.has_usable_password())
+        self.assertTrue(
+            Follow.objects.filter(user=newcomer, author=self.author).exists()
+        )
+        self.assertEqual(Follow.objects.filter(user=newcomer).count(), 1)
+        self.assertEqual(UserStats.objects.get(user=self.author)
+                         .followers_count, 2)
+
+    def checkpoint(self, kind, path, offset, position):
+        ImportCheckpoint.objects.create(
+            name=f'{kind}:{path}', offset=offset, position=position,
+            touched=json.dumps({'authors': [], 'groups': [],
+                                'followers': [], 'commented': []}),
+        )
+
+    def test_resumes_from_checkpoint(self):
+        lines = [json.dumps({'text': f'Пост {i}', 'author': 'author'})
+                 + '\n' for i in range(3)]
+        path = self.write('posts.jsonl', ''.join(lines))
+        # Смещение указывает на третью строку; первые две не читаются.
+        self.checkpoint('posts', path, len(''.join(lines[:2]).encode()), 2)
+        out = self.import_content('posts', path)
+        self.assertIn('Продолжение со строки 2', out)
+        self.assertEqual(list(Post.objects.values_list('text', flat=True)),
+                         ['Пост 2'])
+
+    def test_csv_resumes_after_header(self):
+        post = Post.objects.create(author=self.author, text='Пост')
+        first = f'{post.pk},reader,"Первый,\nв две строки",\n'
+        path = self.write(
+            'comments.csv',
+            'post,author,text,created\n' + first
+            + f'{post.pk},reader,Второй,2021-05-01 10:00\n',
+        )
+        header = len('post,author,text,created\n'.encode())
+        self.checkpoint('comments', path, header + len(first.encode()), 1)
+        self.import_content('comments', path)
+        comment = Comment.objects.get(post=post)
+        self.assertEqual(comment.text, 'Второй')
+        self.assertEqual(comment.created,
+                         timezone.make_aware(datetime(2021, 5, 1, 10)))
+
+    def test_checkpoint_is_saved_with_the_rows(self):
+        path = self.write_jsonl('posts.jsonl', [
+            {'text': f'Пост {i}', 'author': 'author'} for i in range(3)
+        ])
+        with mock.patch('posts.importer.PostImporter.after_commit',
+                        side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.import_content('posts', path, '--batch-size', '2',
+                                    '--chunk-size', '1')
+        checkpoint = ImportCheckpoint.objects.get()
+        self.assertEqual(checkpoint.position, 2)
+        self.assertEqual(Post.objects.count(), 2)
+        self.import_content('posts', path)
+        self.assertEqual(Post.objects.count(), 3)
+
+    def test_malformed_lines_are_skipped(self):
+        path = self.write('posts.jsonl', (
+            '{"text": "Первый", "author": "author"}\n'
+            '{"text": "Оборванная строка\n'
+            '["не объект"]\n'
+            '{"text": "Второй", "author": "author"}\n'
+        ))
+        out = self.import_content('posts', path)
+        self.assertIn('Импортировано: 2, пропущено: 2', out)
+
+    def test_finish_touches_only_imported_records(self):
+        other = User.objects.create_user(username='other')
+        Post.objects.create(author=other, text='Чужой пост')
+        UserStats.objects.filter(user=other).update(posts_count=5)
+        path = self.write_jsonl('posts.jsonl', [
+            {'text': 'Пост', 'author': 'author'},
+        ])
+        out = self.import_content('posts', path)
+        self.assertIn('users: исправлено 1', out)
+        self.assertEqual(UserStats.objects.get(user=other).posts_count, 5)
@@ -0,0 +1,167 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from posts import media, thumbnails
+from posts.models import Post
+from posts.tests.test_thumbnails import image_file
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+GC_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, MEDIA_GC_GRACE=0)
+class SharedImagesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_reuploads_share_file_and_thumbnails(self):
+        first = Post.objects.create(author=self.user, text='Раз',
+                                    image=image_file('a.png'))
+        second = Post.objects.create(author=self.user, text='Два',
+                                     image=image_file('b.png'))
+        self.assertEqual(first.image.name, second.image.name)
+        thumbnails.generate(first.pk)
+        thumbnails.generate(second.pk)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.get_thumbnails(), second.get_thumbnails())
+
+    def test_file_is_released_with_last_reference(self):
+        first = Post.objects.create(author=self.user, text='Раз',
+                                    image=image_file(size=(30, 30)))
+        second = Post.objects.create(author=self.user, text='Два',
+                                     image=image_file(size=(30, 30)))
+        thumbnails.generate(first.pk)
+        first.refresh_from_db()
+        name = first.image.name
+        thumbnail = thumbnails.lookup(first, '960x339')
+
+        first.delete()
+        self.assertFalse(media.release(name))
+        self.assertTrue(media.storage.exists(name))
+
+        second.delete()
+        self.assertTrue(media.release(name))
+        self.assertFalse(media.storage.exists(name))
+        self.assertFalse(thumbnail.exists())
+
+    @override_settings(MEDIA_GC_GRACE=3600)
+    def test_fresh_files_are_kept(self):
+        post = Post.objects.create(author=self.user, text='Пост',
+                                   image=image_file(size=(40, 40)))
+        name = post.image.name
+        post.delete()
+        self.assertFalse(media.release(name))
+        os.utime(media.storage.path(name), (0, 0))
+        self.assertTrue(media.release(name))
+
+    @override_settings(MEDIA_GC_GRACE=3600)
+    def test_reupload_during_deletion_keeps_file(self):
+        name = media.storage.save('posts/a.png', image_file(size=(50, 50)))
+        path = media.storage.path(name)
+        os.utime(path, (0, 0))
+        # Повторная загрузка успела обновить время после проверки сборщика.
+        media.storage.save('posts/b.png', image_file(size=(50, 50)))
+        self.assertIsNone(media.delete_original(name))
+        self.assertTrue(os.path.exists(path))
+        self.assertFalse(os.path.exists(media.trash_path(name)))
+
+        # Загрузка после переноса в корзину пишет файл заново.
+        os.utime(path, (0, 0))
+        os.rename(path, media.trash_path(name))
+        self.assertEqual(media.storage.save('posts/c.png',
+                                            image_file(size=(50, 50))), name)
+        self.assertTrue(os.path.exists(path))
+
+
+@override_settings(MEDIA_ROOT=GC_MEDIA_ROOT, MEDIA_GC_GRACE=0)
+class MediaGarbageCollectorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(GC_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        shutil.rmtree(GC_MEDIA_ROOT, ignore_errors=True)
+
+    def test_sweeps_orphans_and_keeps_live_files(self):
+        post = Post.objects.create(author=self.user, text='Пост',
+                                   image=image_file(size=(20, 20)))
+        thumbnails.generate(post.pk)
+        post.refresh_from_db()
+        live_thumbnail = thumbnails.lookup(post, '960x339')
+        orphan = media.storage.save('posts/orphan.png',
+                                    image_file(size=(21, 21)))
+        stray_thumbnail = default_storage.save('cache/ab/cd/stray.jpg',
+                                               ContentFile(b'x' * 10))
+        upload = os.path.join(GC_MEDIA_ROOT, '.abc.upload')
+        with open(upload, 'wb') as file:
+            file.write(b'x' * 5)
+
+        out = StringIO()
+        call_command('collect_media', stdout=out)
+
+        self.assertTrue(media.storage.exists(post.image.name))
+        self.assertTrue(live_thumbnail.exists())
+        self.assertFalse(media.storage.exists(orphan))
+        self.assertFalse(default_storage.exists(stray_thumbnail))
+        self.assertFalse(os.path.exists(upload))
+        self.assertIn('Удалено файлов: 3', out.getvalue())
+
+    def test_missing_media_root(self):
+        report = media.collect(batch_size=10)
+        self.assertEqual(report['uploads'], (0, 0))
+
+    def test_dry_run_keeps_files(self):
+        orphan = media.storage.save('posts/orphan.png', image_file())
+        report = media.collect(batch_size=10, dry_run=True)
+        self.assertEqual(report['originals'][0], 1)
+        self.assertGreater(report['originals'][1], 0)
+        self.assertTrue(media.storage.exists(orphan))
+
+    @override_settings(MEDIA_GC_GRACE=3600)
+    def test_fresh_orphans_are_kept(self):
+        orphan = media.storage.save('posts/orphan.png', image_file())
+        media.collect(batch_size=10)
+        self.assertTrue(media.storage.exists(orphan))
+
+    def test_resumes_from_cursor(self):
+        orphans = sorted(
+            media.storage.save('posts/orphan.png',
+                               image_file(size=(10 + i, 10)))
+            for i in range(3)
+        )
+        media.collect(batch_size=2, max_batches=1)
+        self.assertFalse(media.storage.exists(orphans[0]))
+        self.assertFalse(media.storage.exists(orphans[1]))
+        self.assertTrue(media.storage.exists(orphans[2]))
+        self.assertIsNotNone(cache.get('media_gc:originals'))
+
+        media.collect(batch_size=2, max_batches=1)
+        self.assertFalse(media.storage.exists(orphans[2]))
+        self.assertIsNone(cache.get('media_gc:originals'))
@@ -1,9 +1,11 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
-from posts.models import Group, Post
+from posts.models import Comment, Follow, Group, Post
+from posts.utils import ELLIPSIS, get_elided_page_range
 
 User = get_user_model()
 
@@ -51,3 +53,138 @@ class PaginatorViewsTest(TestCase):
             with self.subTest(reverse_name=reverse_name):
                 response = self.authorized_client.get(reverse_name)
                 self.assertEqual(len(response.context['page_obj']), expected)
+
+    def test_cursor_pages(self):
+        """Курсоры ?after= и ?before= обходят ленту без пропусков."""
+        path = reverse('posts:profile',
+                       kwargs={'username': self.user.username})
+        first_page = self.authorized_client.get(path).context['page_obj']
+        self.assertIsNone(first_page.previous_cursor)
+        self.assertEqual(len(first_page), settings.PAGE_SIZE)
+
+        response = self.authorized_client.get(
+            path, {'after': first_page.next_cursor}
+        )
+        second_page = response.context['page_obj']
+        self.assertEqual(len(second_page),
+                         Post.objects.count() - settings.PAGE_SIZE)
+        self.assertIsNone(second_page.next_cursor)
+        self.assertFalse(set(first_page) & set(second_page))
+
+        response = self.authorized_client.get(
+            path, {'before': second_page.previous_cursor}
+        )
+        self.assertEqual(list(response.context['page_obj']),
+                         list(first_page))
+
+    def test_follow_feed_cursor_pages(self):
+        """Лента подписок листается по курсору из TimelineEntry."""
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.user)
+        client = Client()
+        client.force_login(reader)
+        path = reverse('posts:follow_index')
+        page = client.get(path).context['page_obj']
+        loaded = list(page)
+        while page.next_cursor:
+            page = client.get(
+                path, {'after': page.next_cursor}
+            ).context['page_obj']
+            loaded += list(page)
+        self.assertEqual(loaded, list(Post.objects.order_by('-created')))
+
+    def test_broken_cursor_falls_back_to_first_page(self):
+        response = self.authorized_client.get(
+            reverse('posts:index'), {'after': 'не-курсор'}
+        )
+        self.assertEqual(len(response.context['page_obj']),
+                         settings.PAGE_SIZE)
+
+
+@override_settings(COMMENTS_PAGE_SIZE=3)
+class CommentsPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='commenter')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        for i in range(7):
+            Comment.objects.create(post=cls.post, author=cls.user,
+                                   text=f'Комментарий {i}')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_comments_are_loaded_in_batches(self):
+        """Комментарии выдаются порциями по порядку написания."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        page = response.context['comments_page']
+        loaded = list(page)
+        while page.next_cursor:
+            response = self.client.get(
+                reverse('posts:post_comments',
+                        kwargs={'post_id': self.post.pk}),
+                {'after': page.next_cursor},
+            )
+            page = response.context['comments_page']
+            self.assertLessEqual(len(page), 3)
+            loaded += list(page)
+        self.assertEqual(
+            loaded, list(Comment.objects.order_by('created', 'pk'))
+        )
+
+    def test_more_link_points_to_fragment(self):
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        self.assertContains(
+            response,
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk})
+            + '?after=' + response.context['comments_page'].next_cursor,
+        )
+
+    def test_new_comment_invalidates_cached_comments(self):
+        path = reverse('posts:post_comments',
+                       kwargs={'post_id': self.post.pk})
+        after = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        ).context['comments_page'].next_cursor
+        for _ in range(2):
+            self.client.get(path, {'after': after})
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Новый комментарий'},
+        )
+        response = self.client.get(path, {'after': after})
+        next_page = self.client.get(
+            path, {'after': response.context['comments_page'].next_cursor}
+        )
+        self.assertContains(next_page, 'Новый комментарий')
+
+    def test_missing_post(self):
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class ElidedPageRangeTest(TestCase):
+    def test_short_range_is_not_elided(self):
+        self.assertEqual(list(get_elided_page_range(2, 5)), [1, 2, 3, 4, 5])
+
+    def test_long_range_is_bounded(self):
+        page_range = list(get_elided_page_range(5000, 10000))
+        self.assertEqual(page_range, [
+            1, 2, ELLIPSIS, 4997, 4998, 4999, 5000, 5001, 5002, 5003,
+            ELLIPSIS, 9999, 10000,
+        ])
+
+    def test_range_near_ends(self):
+        self.assertEqual(list(get_elided_page_range(1, 100)),
+                         [1, 2, 3, 4, ELLIPSIS, 99, 100])
+        self.assertEqual(list(get_elided_page_range(100, 100)),
+                         [1, 2, ELLIPSIS, 97, 98, 99, 100])
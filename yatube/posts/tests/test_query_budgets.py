@@ -0,0 +1,78 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class QueryBudgetTest(TestCase):
+    """Страницы укладываются в QUERY_BUDGETS при холодном кеше."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        authors = [User.objects.create_user(username=f'author{i}')
+                   for i in range(3)]
+        groups = [Group.objects.create(title=f'Группа {i}', slug=f'g{i}',
+                                       description='Описание')
+                  for i in range(3)]
+        for author in authors:
+            Follow.objects.create(user=cls.user, author=author)
+        for i in range(settings.PAGE_SIZE * 2):
+            cls.post = Post.objects.create(
+                author=authors[i % len(authors)],
+                group=groups[i % len(groups)],
+                text=f'Пост {i}',
+            )
+            for reader in authors:
+                Comment.objects.create(post=cls.post, author=reader,
+                                       text='Комментарий')
+        cls.author = authors[0]
+        cls.group = groups[0]
+        cls.own_post = Post.objects.create(author=cls.user, text='Свой пост')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def urls(self):
+        return {
+            'posts:index': reverse('posts:index'),
+            'posts:group_list': reverse('posts:group_list',
+                                        kwargs={'slug': self.group.slug}),
+            'posts:profile': reverse('posts:profile',
+                                     kwargs={'username':
+                                             self.author.username}),
+            'posts:post_detail': reverse('posts:post_detail',
+                                         kwargs={'post_id': self.post.pk}),
+            'posts:post_comments': reverse('posts:post_comments',
+                                           kwargs={'post_id': self.post.pk}),
+            'posts:follow_index': reverse('posts:follow_index'),
+            'posts:search': reverse('posts:search') + '?q=пост',
+            'posts:post_create': reverse('posts:post_create'),
+            'posts:post_edit': reverse('posts:post_edit',
+                                       kwargs={'pid': self.own_post.pk}),
+        }
+
+    def test_every_budget_is_checked(self):
+        self.assertEqual(set(self.urls()), set(settings.QUERY_BUDGETS))
+
+    def test_pages_fit_budgets(self):
+        for name, path in self.urls().items():
+            separator = '&' if '?' in path else '?'
+            for query in ('', separator + 'page=2'):
+                with self.subTest(name=name, query=query):
+                    cache.clear()
+                    with CaptureQueriesContext(connection) as queries:
+                        self.client.get(path + query)
+                    self.assertLessEqual(
+                        len(queries), settings.QUERY_BUDGETS[name],
+                        '\n'.join(q['sql'] for q in queries.captured_queries)
+                    )
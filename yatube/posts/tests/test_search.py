@@ -0,0 +1,82 @@
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Post
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        cls.cat = Post.objects.create(author=cls.user,
+                                      text='Кот спит на окне')
+        cls.cats = Post.objects.create(author=cls.user,
+                                       text='Кот и кот: котики дома')
+        cls.dog = Post.objects.create(author=cls.user,
+                                      text='Собака гуляет во дворе')
+
+    def search(self, query, **params):
+        response = Client().get(reverse('posts:search'),
+                                {'q': query, **params})
+        return list(response.context['page_obj'])
+
+    def test_results_are_ranked(self):
+        self.assertEqual(self.search('кот'), [self.cats, self.cat])
+
+    def test_words_are_prefixes_and_all_required(self):
+        self.assertEqual(self.search('соба двор'), [self.dog])
+        self.assertEqual(self.search('кот двор'), [])
+
+    def test_empty_and_special_queries(self):
+        self.assertEqual(self.search(''), [])
+        self.assertEqual(self.search('" OR *'), [])
+
+    def test_results_are_paginated(self):
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Погода {i}')
+            for i in range(settings.PAGE_SIZE + 2)
+        )
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(self.search('погода')), settings.PAGE_SIZE)
+        self.assertEqual(len(self.search('погода', page=2)), 2)
+        response = Client().get(reverse('posts:search'), {'q': 'погода'})
+        self.assertContains(response, '?q=%D0%BF%D0%BE%D0%B3%D0%BE%D0%B4'
+                                      '%D0%B0&amp;page=2')
+
+    def test_index_follows_edits_and_deletes(self):
+        post = Post.objects.create(author=self.user, text='Черновик')
+        post.text = 'Гроза над морем'
+        post.save()
+        self.assertEqual(self.search('черновик'), [])
+        self.assertEqual(self.search('гроза'), [post])
+        post.delete()
+        self.assertEqual(self.search('гроза'), [])
+
+    def test_admin_search_uses_index(self):
+        client = Client()
+        client.force_login(self.admin)
+        response = client.get(reverse('admin:posts_post_changelist'),
+                              {'q': 'собака'})
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.dog])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_post_fts')
+        self.assertEqual(self.search('кот'), [])
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn(str(Post.objects.count()), out.getvalue())
+        self.assertEqual(self.search('кот'), [self.cats, self.cat])
@@ -0,0 +1,171 @@
+import shutil
+import tempfile
+import unittest
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image, features
+from sorl.thumbnail import default
+
+from posts import thumbnails
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+UPLOAD_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def image_file(name='photo.png', size=(100, 50)):
+    content = BytesIO()
+    Image.new('RGB', size, (255, 0, 0)).save(content, 'PNG')
+    return SimpleUploadedFile(name, content.getvalue(),
+                              content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Пост',
+                                       image=image_file())
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.get(pk=self.post.pk)
+
+    def test_original_is_shown_until_thumbnail_is_ready(self):
+        path = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.assertIsNone(thumbnails.lookup(self.post, '960x339'))
+        self.assertContains(Client().get(path), self.post.image.url)
+
+        thumbnails.generate(self.post.pk)
+        self.post.refresh_from_db()
+        thumbnail = thumbnails.lookup(self.post, '960x339')
+        self.assertIsNotNone(thumbnail)
+        self.assertTrue(thumbnail.exists())
+        response = Client().get(path)
+        self.assertContains(response, thumbnail.url)
+        self.assertNotContains(response, self.post.image.url)
+
+    def test_page_render_does_not_generate_thumbnails(self):
+        Client().get(reverse('posts:index'))
+        self.post.refresh_from_db()
+        self.assertIsNone(thumbnails.lookup(self.post, '960x339'))
+
+    def test_generate_command(self):
+        call_command('generate_thumbnails', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertIsNotNone(thumbnails.lookup(self.post, '960x339'))
+
+    def test_feed_resolves_thumbnails_without_lookups(self):
+        """Миниатюры берутся из строк постов, а не по запросу на пост."""
+        path = reverse('posts:index')
+        cache.clear()
+        with CaptureQueriesContext(connection) as one_post:
+            Client().get(path)
+        for _ in range(3):
+            post = Post.objects.create(author=self.user, text='Ещё',
+                                       image=image_file())
+            thumbnails.generate(post.pk)
+        cache.clear()
+        with CaptureQueriesContext(connection) as many_posts:
+            response = Client().get(path)
+        self.assertEqual(len(one_post), len(many_posts))
+        self.assertContains(response, 'srcset=', count=3)
+
+    @override_settings(THUMBNAIL_WEBP=False)
+    def test_variants_are_listed_in_srcset(self):
+        thumbnails.generate(self.post.pk)
+        self.post.refresh_from_db()
+        names = self.post.get_thumbnails()
+        self.assertEqual(set(names), {'320x113', '640x226', '960x339'})
+        response = Client().get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        srcset = ', '.join(
+            f'{default.storage.url(names[size])} {size.split("x")[0]}w'
+            for size in ('320x113', '640x226', '960x339')
+        )
+        self.assertContains(response, f'srcset="{srcset}"')
+        self.assertNotContains(response, '<picture>')
+
+    @unittest.skipUnless(features.check('webp'), 'Pillow без WebP')
+    @override_settings(THUMBNAIL_WEBP=True)
+    def test_webp_variants(self):
+        thumbnails.generate(self.post.pk)
+        self.post.refresh_from_db()
+        self.assertIn('960x339.webp', self.post.get_thumbnails())
+        response = Client().get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        self.assertContains(response, '<source type="image/webp"')
+
+    def test_new_image_resets_thumbnails(self):
+        thumbnails.generate(self.post.pk)
+        post = Post.objects.get(pk=self.post.pk)
+        post.image = image_file('other.png', size=(80, 40))
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.get_thumbnails(), {})
+
+    def test_text_edit_keeps_thumbnails(self):
+        post = Post.objects.get(pk=self.post.pk)
+        thumbnails.generate(self.post.pk)
+        post.text = 'Новый текст'
+        post.save()
+        post.refresh_from_db()
+        self.assertIn('960x339', post.get_thumbnails())
+
+
+@override_settings(MEDIA_ROOT=UPLOAD_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class UploadThumbnailsTest(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(UPLOAD_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='uploader')
+        self.client.force_login(self.user)
+
+    def test_upload_generates_thumbnails(self):
+        self.client.post(reverse('posts:post_create'),
+                         {'text': 'С картинкой', 'image': image_file()})
+        post = Post.objects.get()
+        self.assertIsNotNone(thumbnails.lookup(post, '960x339'))
+
+    @override_settings(UPLOAD_MAX_SIDE=40, UPLOAD_WORKERS=0)
+    def test_upload_is_replaced_with_processed_copy(self):
+        self.client.post(reverse('posts:post_create'),
+                         {'text': 'С картинкой',
+                          'image': image_file(size=(100, 50))})
+        post = Post.objects.get()
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (40, 20))
+        self.assertIsNotNone(thumbnails.lookup(post, '960x339'))
+
+    def test_edit_without_new_image_skips_generation(self):
+        post = Post.objects.create(author=self.user, text='Пост',
+                                   image=image_file())
+        self.client.post(reverse('posts:post_edit', kwargs={'pid': post.pk}),
+                         {'text': 'Другой текст'})
+        post.refresh_from_db()
+        self.assertIsNone(thumbnails.lookup(post, '960x339'))
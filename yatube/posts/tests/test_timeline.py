@@ -0,0 +1,60 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from core.cache_tags import tags_version
+from posts.feed_cache import follow_tag
+from posts.models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.old_post = Post.objects.create(author=cls.author,
+                                           text='Старый пост')
+
+    def timeline_posts(self):
+        return list(Post.objects.filter(timeline_entries__user=self.reader))
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.timeline_posts(), [self.old_post])
+        Follow.objects.filter(user=self.reader, author=self.author).delete()
+        self.assertEqual(self.timeline_posts(), [])
+
+    def test_new_post_is_pushed_to_followers(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(self.timeline_posts(), [new_post, self.old_post])
+
+    @override_settings(FOLLOW_TIMELINE_SIZE=2)
+    def test_timeline_is_capped(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [Post.objects.create(author=self.author, text=f'Пост {i}')
+                 for i in range(3)]
+        out = StringIO()
+        call_command('trim_timelines', stdout=out)
+        self.assertIn('Удалено записей: 2', out.getvalue())
+        self.assertEqual(self.timeline_posts(), posts[:0:-1])
+
+    def test_rebuild_invalidates_follow_pages(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        version = tags_version(follow_tag(self.reader.pk))
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertNotEqual(tags_version(follow_tag(self.reader.pk)),
+                            version)
+
+    def test_rebuild_command(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        TimelineEntry.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_timelines', stdout=out)
+        self.assertEqual(self.timeline_posts(), [self.old_post])
+        self.assertIn('1', out.getvalue())
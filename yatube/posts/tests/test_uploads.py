@@ -0,0 +1,147 @@
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image, features
+
+from posts import uploads
+from posts.forms import PostForm
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+ORIENTATION = 0x0112
+
+
+def jpeg_file(size=(400, 200), exif=None):
+    content = BytesIO()
+    image = Image.new('RGB', size, (0, 128, 255))
+    options = {}
+    if exif is not None:
+        options['exif'] = exif
+    image.save(content, 'JPEG', **options)
+    return SimpleUploadedFile('photo.jpeg', content.getvalue(),
+                              content_type='image/jpeg')
+
+
+def exif_with(**tags):
+    exif = Image.Exif()
+    exif[ORIENTATION] = tags.get('orientation', 1)
+    exif[0x010f] = 'Camera'
+    return exif
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, UPLOAD_MAX_SIDE=100)
+class UploadProcessingTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def clean_image(self, upload):
+        form = PostForm(data={'text': 'Пост'}, files={'image': upload})
+        return form, form.is_valid()
+
+    def process(self, upload):
+        path = os.path.join(TEMP_MEDIA_ROOT, upload.name)
+        with open(path, 'wb') as file:
+            file.write(upload.read())
+        return uploads.process(path, upload.name)
+
+    def test_form_only_checks_header(self):
+        upload = jpeg_file()
+        with mock.patch.object(uploads, 'process_file') as process_file:
+            form, valid = self.clean_image(upload)
+        self.assertTrue(valid, form.errors)
+        self.assertIs(form.cleaned_data['image'], upload)
+        process_file.assert_not_called()
+
+    def test_original_is_downscaled_and_stripped(self):
+        # Orientation 6: камера повёрнута, картинку нужно развернуть.
+        processed = self.process(jpeg_file(exif=exif_with(orientation=6)))
+        self.assertEqual(processed.name, 'photo.jpg')
+        with Image.open(processed.temporary_file_path()) as image:
+            self.assertEqual(image.size, (50, 100))
+            self.assertEqual(dict(image.getexif()), {})
+
+    def test_processed_file_is_moved_to_storage(self):
+        processed = self.process(jpeg_file())
+        path = processed.temporary_file_path()
+        saved = default_storage.save('posts/photo.jpg', processed)
+        # Временный файл перенесён в хранилище, а не скопирован.
+        self.assertFalse(os.path.exists(path))
+        with Image.open(os.path.join(TEMP_MEDIA_ROOT, saved)) as image:
+            self.assertEqual(image.size, (100, 50))
+
+    def test_png_metadata_is_stripped(self):
+        content = BytesIO()
+        Image.new('RGB', (200, 100)).save(content, 'PNG',
+                                          exif=exif_with().tobytes())
+        processed = self.process(SimpleUploadedFile(
+            'photo.png', content.getvalue(), content_type='image/png'
+        ))
+        with Image.open(processed) as image:
+            self.assertEqual(image.format, 'PNG')
+            self.assertNotIn('exif', image.info)
+            self.assertEqual(dict(image.getexif()), {})
+
+    @override_settings(UPLOAD_WORKERS=1)
+    def test_broken_pool_is_replaced(self):
+        broken = mock.Mock()
+        broken.submit.return_value.result.side_effect = BrokenProcessPool
+        parent = mock.Mock(daemon=False)
+        with mock.patch.object(uploads, '_executor', broken), \
+                mock.patch.object(uploads.multiprocessing, 'current_process',
+                                  return_value=parent):
+            with self.assertRaises(uploads.ProcessingFailed):
+                self.process(jpeg_file())
+            self.assertIsNone(uploads._executor)
+        broken.shutdown.assert_called_once_with(wait=False)
+
+    @override_settings(UPLOAD_WORKERS=1)
+    def test_pool_uses_spawn(self):
+        uploads.reset_executor(uploads.get_executor())
+        executor = uploads.get_executor()
+        try:
+            self.assertEqual(executor._mp_context.get_start_method(),
+                             'spawn')
+        finally:
+            uploads.reset_executor(executor)
+
+    @override_settings(UPLOAD_WORKERS=1)
+    def test_daemonic_process_skips_pool(self):
+        daemon = mock.Mock(daemon=True)
+        with mock.patch.object(uploads, 'get_executor') as get_executor, \
+                mock.patch.object(uploads.multiprocessing, 'current_process',
+                                  return_value=daemon):
+            self.process(jpeg_file())
+        get_executor.assert_not_called()
+
+    @override_settings(UPLOAD_MAX_PIXELS=1000)
+    def test_decompression_bomb_is_rejected(self):
+        form, valid = self.clean_image(jpeg_file())
+        self.assertFalse(valid)
+        self.assertIn('image', form.errors)
+
+    @override_settings(UPLOAD_MAX_BYTES=10)
+    def test_large_file_is_rejected(self):
+        form, valid = self.clean_image(jpeg_file())
+        self.assertFalse(valid)
+        self.assertIn('image', form.errors)
+
+    @override_settings(UPLOAD_WORKERS=0)
+    def test_processing_without_pool(self):
+        with Image.open(self.process(jpeg_file())) as image:
+            self.assertEqual(image.size, (100, 50))
+
+    @unittest.skipUnless(features.check('webp'), 'Pillow без WebP')
+    @override_settings(UPLOAD_WEBP=True)
+    def test_webp(self):
+        self.assertEqual(self.process(jpeg_file()).name, 'photo.webp')
@@ -1,3 +1,4 @@
+import hashlib
 import shutil
 import tempfile
 
@@ -12,6 +13,8 @@ from django.db import transaction
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
+from core.cache_tags import tags_version
+from posts.feed_cache import follow_tag
 from posts.models import Follow, Group, Post
 
 User = get_user_model()
@@ -49,6 +52,8 @@ class PostPagesTests(TestCase):
             b'\x02\x00\x01\x00\x00\x02\x02\x0C'
             b'\x0A\x00\x3B'
         )
+        digest = hashlib.sha256(small_gif).hexdigest()
+        cls.image_name = f'posts/{digest[:2]}/{digest[2:4]}/{digest}.gif'
         cls.post_image = SimpleUploadedFile(
             name='small.gif',
             content=small_gif,
@@ -67,6 +72,7 @@ class PostPagesTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
         self.unsubscribed_client = Client()
@@ -103,15 +109,23 @@ class PostPagesTests(TestCase):
     def test_index_page_cache(self):
         path = reverse('posts:index')
         response = self.authorized_client.get(path)
-        content_before_delete = response.content
-        Post.objects.last().delete()
+        content_before_update = response.content
+        # update() не отправляет сигналы, поэтому кеш не сбрасывается.
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
         response = self.authorized_client.get(path)
-        content_after_delete = response.content
-        self.assertEqual(content_before_delete, content_after_delete)
+        content_after_update = response.content
+        self.assertEqual(content_before_update, content_after_update)
         cache.clear()
         response = self.authorized_client.get(path)
         content_after_cache_clear = response.content
-        self.assertNotEqual(content_after_cache_clear, content_before_delete)
+        self.assertNotEqual(content_after_cache_clear, content_before_update)
+
+    def test_index_page_cache_invalidated_by_tags(self):
+        path = reverse('posts:index')
+        content_before_delete = self.authorized_client.get(path).content
+        Post.objects.last().delete()
+        content_after_delete = self.authorized_client.get(path).content
+        self.assertNotEqual(content_before_delete, content_after_delete)
 
     def test_post_list_pages_show_correct_context(self):
         paths = [reverse('posts:index'),
@@ -136,7 +150,7 @@ class PostPagesTests(TestCase):
         self.assertEqual(post.text, self.post.text)
         self.assertEqual(post.author.username, self.user.username)
         self.assertEqual(post.group.slug, self.group.slug)
-        self.assertEqual(post.image, f'posts/{self.post_image.name}')
+        self.assertEqual(post.image, self.image_name)
 
     def test_create_form_show_correct_context(self):
         path = reverse('posts:post_create')
@@ -223,3 +237,89 @@ class PostPagesTests(TestCase):
         redirect_path = reverse('posts:profile',
                                 kwargs={'username': self.old_author.username})
         self.assertRedirects(response, redirect_path)
+
+    def test_follow_page_cache_is_per_user_and_invalidated(self):
+        path = reverse('posts:follow_index')
+        Post.objects.create(author=self.old_author, text='Пост подписки')
+        response = self.authorized_client.get(path)
+        self.assertContains(response, 'Пост подписки')
+        response = self.unsubscribed_client.get(path)
+        self.assertNotContains(response, 'Пост подписки')
+        # Новый пост сбрасывает тег автора, а не теги его подписчиков.
+        version = tags_version(follow_tag(self.user.pk))
+        post = Post.objects.create(author=self.old_author, text='Свежий пост')
+        self.assertEqual(tags_version(follow_tag(self.user.pk)), version)
+        response = self.authorized_client.get(path)
+        self.assertContains(response, 'Свежий пост')
+        post.text = 'Исправленный пост'
+        post.save()
+        response = self.authorized_client.get(path)
+        self.assertContains(response, 'Исправленный пост')
+
+    def test_conditional_get(self):
+        paths = [reverse('posts:index'),
+                 reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+                 reverse('posts:profile',
+                         kwargs={'username': self.user.username}),
+                 reverse('posts:post_detail',
+                         kwargs={'post_id': self.post.pk}),
+                 reverse('posts:follow_index')]
+        for path in paths:
+            with self.subTest(path=path):
+                response = self.authorized_client.get(path)
+                etag = response['ETag']
+                response = self.authorized_client.get(
+                    path, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code,
+                                 HTTPStatus.NOT_MODIFIED)
+
+    def test_etag_changes_after_edit(self):
+        path = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        response = self.authorized_client.get(path)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Изменённый текст'
+        post.save()
+        response = self.authorized_client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, 'Изменённый текст')
+
+    def test_last_modified_moves_forward_on_delete(self):
+        path = reverse('posts:index')
+        post = Post.objects.create(author=self.user, text='Удаляемый пост')
+        response = self.authorized_client.get(path)
+        last_modified = response['Last-Modified']
+        response = self.authorized_client.get(
+            path, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        # Удаление в ту же секунду тоже должно сдвинуть Last-Modified.
+        post.delete()
+        response = self.authorized_client.get(
+            path, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotContains(response, 'Удаляемый пост')
+
+    def test_cached_feed_page_runs_no_queries(self):
+        path = reverse('posts:index')
+        client = Client()
+        first = client.get(path)
+        with self.assertNumQueries(0):
+            second = client.get(path)
+        self.assertEqual(second.content, first.content)
+
+    def test_feed_cards_need_no_extra_queries(self):
+        paths = [reverse('posts:index'),
+                 reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+                 reverse('posts:profile',
+                         kwargs={'username': self.user.username})]
+        for path in paths:
+            with self.subTest(path=path):
+                page_obj = self.authorized_client.get(path).context['page_obj']
+                with self.assertNumQueries(0):
+                    for post in page_obj:
+                        post.author.get_full_name()
+                        post.group.slug
@@ -0,0 +1,179 @@
+"""Заранее нарезанные миниатюры картинок постов.
+
+После сохранения поста с картинкой все размеры из GEOMETRIES вместе с
+адаптивными вариантами (VARIANT_WIDTHS, WebP) готовятся в фоновом пуле
+потоков, поэтому запрос ленты не декодирует и не
+масштабирует оригиналы. Имена готовых файлов записываются в
+Post.thumbnails, так что тег {% post_image %} берёт их из уже
+загруженной строки поста без обращений к key-value хранилищу sorl, а
+пока миниатюр нет, отдаёт оригинал. Только что загруженную картинку тот
+же поток сначала обрабатывает (posts.uploads.process) и подменяет ею
+оригинал в посте.
+"""
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from PIL import features
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.images import ImageFile
+
+from . import media, uploads
+from .feed_cache import invalidate_post
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Размеры и параметры, с которыми шаблоны выводят картинки постов.
+GEOMETRIES = {
+    '960x339': {'crop': 'center', 'upscale': True},
+}
+# Ширины уменьшенных вариантов для srcset; пропорции те же, что у размера.
+VARIANT_WIDTHS = (320, 640)
+
+_executor = None
+_lock = threading.Lock()
+_pending = set()
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
+
+
+def drain():
+    """Дожидается всех задач пула; следующая постановка запустит новый."""
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def webp_enabled():
+    return settings.THUMBNAIL_WEBP and features.check('webp')
+
+
+def variant_key(geometry, image_format):
+    return geometry if image_format == 'JPEG' else f'{geometry}.webp'
+
+
+def variants(geometry):
+    """(ключ, размер, параметры sorl) для всех вариантов размера."""
+    width, height = map(int, geometry.split('x'))
+    formats = ('JPEG', 'WEBP') if webp_enabled() else ('JPEG',)
+    widths = sorted({w for w in VARIANT_WIDTHS if w < width} | {width})
+    for variant_width in widths:
+        size = f'{variant_width}x{round(height * variant_width / width)}'
+        for image_format in formats:
+            options = dict(GEOMETRIES[geometry], format=image_format)
+            yield variant_key(size, image_format), size, options
+
+
+def lookup(post, geometry):
+    """Готовая миниатюра поста или None; сама миниатюру не создаёт."""
+    name = post.get_thumbnails().get(geometry)
+    if name is None:
+        return None
+    return ImageFile(name, default.storage)
+
+
+def srcset(post, geometry, image_format='JPEG'):
+    """Значение srcset из готовых вариантов размера в нужном формате."""
+    names = post.get_thumbnails()
+    candidates = []
+    for key, size, options in variants(geometry):
+        if key == variant_key(size, image_format) and key in names:
+            candidates.append(
+                f'{default.storage.url(names[key])} {size.split("x")[0]}w'
+            )
+    return ', '.join(candidates)
+
+
+def generate(post_id):
+    """Создаёт все миниатюры поста и сбрасывает страницы с ним."""
+    post = Post.objects.filter(pk=post_id).only(
+        'image', 'author_id', 'group_id'
+    ).first()
+    if post is None or not post.image:
+        return
+    names = {
+        key: get_thumbnail(post.image, size, **options).name
+        for geometry in GEOMETRIES
+        for key, size, options in variants(geometry)
+    }
+    # Пока резались миниатюры, картинку могли заменить.
+    Post.objects.filter(pk=post_id, image=post.image.name).update(
+        thumbnails=json.dumps(names)
+    )
+    invalidate_post(post, [post.group_id])
+
+
+def replace_original(post_id, name):
+    """Подменяет загруженную картинку поста её обработанной копией."""
+    field = Post._meta.get_field('image')
+    processed = uploads.process(field.storage.path(name), name)
+    try:
+        new_name = field.storage.save(
+            field.generate_filename(None, processed.name), processed
+        )
+    finally:
+        processed.close()
+    # Пока шла обработка, картинку могли заменить.
+    if new_name != name and Post.objects.filter(
+            pk=post_id, image=name).update(image=new_name, thumbnails=''):
+        media.release(name)
+
+
+def prepare(post_id, original=None):
+    """Обрабатывает загруженный оригинал, если он есть, и режет миниатюры."""
+    if original is not None:
+        try:
+            replace_original(post_id, original)
+        except Exception:
+            # Миниатюры всё равно нужны: их можно нарезать и из оригинала.
+            logger.exception('Не удалось обработать картинку поста %s',
+                             post_id)
+    generate(post_id)
+
+
+def _run(post_id, original):
+    try:
+        prepare(post_id, original)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры поста %s', post_id)
+    finally:
+        with _lock:
+            _pending.discard((post_id, original))
+        connection.close()
+
+
+def submit(post_id, original=None):
+    """Ставит пост в очередь пула; повторная постановка игнорируется."""
+    if not settings.THUMBNAIL_WORKERS:
+        prepare(post_id, original)
+        return
+    with _lock:
+        if (post_id, original) in _pending:
+            return
+        _pending.add((post_id, original))
+    get_executor().submit(_run, post_id, original)
+
+
+def schedule(post, uploaded=False):
+    """Готовит миниатюры поста после фиксации транзакции.
+
+    uploaded — картинку только что загрузили, и её нужно обработать.
+    """
+    if post.image:
+        original = post.image.name if uploaded else None
+        transaction.on_commit(lambda: submit(post.pk, original))
@@ -0,0 +1,127 @@
+"""Материализованные ленты подписок (fan-out on write).
+
+Каждый новый пост раскладывается в ленты подписчиков автора, поэтому
+follow_index читает один индексированный диапазон TimelineEntry вместо
+соединения через Follow. Лента пользователя ограничена
+FOLLOW_TIMELINE_SIZE последними постами: push_post только добавляет
+записи, а лишние удаляет периодическая команда trim_timelines, поэтому
+публикация поста не обходит ленты всех подписчиков автора.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+
+from .models import Follow, Post, TimelineEntry
+from .utils import chunked
+
+REBUILD_SQL = (
+    'INSERT INTO {timeline} (user_id, post_id, created) '
+    'SELECT user_id, post_id, created FROM ('
+    'SELECT follow.user_id, post.id AS post_id, post.created, '
+    'ROW_NUMBER() OVER (PARTITION BY follow.user_id '
+    'ORDER BY post.created DESC, post.id DESC) AS position '
+    'FROM {follow} AS follow JOIN {post} AS post '
+    'ON post.author_id = follow.author_id '
+    'WHERE follow.user_id IN ({placeholders})'
+    ') WHERE position <= %s'
+)
+
+TRIM_SQL = (
+    'DELETE FROM {timeline} WHERE id IN ('
+    'SELECT id FROM ('
+    'SELECT id, ROW_NUMBER() OVER (PARTITION BY user_id '
+    'ORDER BY created DESC, post_id DESC) AS position '
+    'FROM {timeline} WHERE user_id IN ({placeholders})'
+    ') WHERE position > %s)'
+)
+
+
+def trim(user_ids):
+    """Удаляет из лент записи сверх FOLLOW_TIMELINE_SIZE.
+
+    На пачку пользователей уходит один DELETE: ROW_NUMBER() нумерует
+    записи каждой ленты по индексу (user, -created, -post). Возвращает
+    число удалённых записей.
+    """
+    deleted = 0
+    for chunk in chunked(user_ids):
+        sql = TRIM_SQL.format(
+            timeline=TimelineEntry._meta.db_table,
+            placeholders=', '.join(['%s'] * len(chunk)),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [*chunk, settings.FOLLOW_TIMELINE_SIZE])
+            deleted += cursor.rowcount
+    return deleted
+
+
+def overgrown():
+    """Пользователи, чьи ленты выросли сверх FOLLOW_TIMELINE_SIZE."""
+    return list(TimelineEntry.objects.order_by().values('user_id').annotate(
+        total=Count('pk')
+    ).filter(
+        total__gt=settings.FOLLOW_TIMELINE_SIZE
+    ).values_list('user_id', flat=True))
+
+
+def push_post(post):
+    """Кладёт новый пост в ленты всех подписчиков автора.
+
+    Ленты не обрезаются: это делает trim_timelines вне запроса.
+    """
+    follower_ids = list(
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)
+    )
+    if not follower_ids:
+        return
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post=post, created=post.created)
+         for user_id in follower_ids],
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту пользователя последние посты автора."""
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'created'
+    )[:settings.FOLLOW_TIMELINE_SIZE]
+    with transaction.atomic():
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=user_id, post_id=pk, created=created)
+             for pk, created in posts],
+            ignore_conflicts=True,
+        )
+        trim([user_id])
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты пользователя посты автора."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def rebuild(user_id):
+    """Пересобирает ленту пользователя по текущим подпискам."""
+    rebuild_many([user_id])
+
+
+def rebuild_many(user_ids):
+    """Пересобирает ленты пачками пользователей.
+
+    На пачку уходит один DELETE и один INSERT ... SELECT, в котором
+    ROW_NUMBER() оставляет по FOLLOW_TIMELINE_SIZE последних постов
+    на пользователя.
+    """
+    for chunk in chunked(user_ids):
+        sql = REBUILD_SQL.format(
+            timeline=TimelineEntry._meta.db_table,
+            follow=Follow._meta.db_table,
+            post=Post._meta.db_table,
+            placeholders=', '.join(['%s'] * len(chunk)),
+        )
+        with transaction.atomic(), connection.cursor() as cursor:
+            TimelineEntry.objects.filter(user_id__in=chunk).delete()
+            cursor.execute(sql, [*chunk, settings.FOLLOW_TIMELINE_SIZE])
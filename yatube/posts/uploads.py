@@ -0,0 +1,188 @@
+"""Обработка загружаемых картинок постов.
+
+В запросе картинка только проверяется по заголовку (check): размер
+файла, число пикселей и формат, без декодирования. После сохранения
+поста фоновый поток (см. posts.thumbnails) вызывает process: копия
+уменьшается до UPLOAD_MAX_SIDE, поворачивается по EXIF и сохраняется
+без метаданных, при UPLOAD_WEBP — в WebP, и подменяет оригинал. Сама
+обработка идёт в пуле процессов, запущенных через spawn: fork процесса
+с работающими потоками мог бы унести в дочерний процесс чужие
+заблокированные мьютексы. Пулу передаются только пути к файлам, поэтому
+модуль не импортирует модели.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image, ImageOps, features
+
+# Формат Pillow → расширение и MIME-тип сохранённого файла.
+FORMATS = {
+    'JPEG': ('jpg', 'image/jpeg'),
+    'PNG': ('png', 'image/png'),
+    'GIF': ('gif', 'image/gif'),
+    'WEBP': ('webp', 'image/webp'),
+}
+
+_executor = None
+_lock = threading.Lock()
+
+
+class ImageRejected(ValueError):
+    """Картинка не прошла проверку размеров или формата."""
+
+
+class ProcessingFailed(OSError):
+    """Процесс пула упал во время обработки картинки."""
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.UPLOAD_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _executor
+
+
+def reset_executor(broken):
+    """Убирает сломанный пул; следующая загрузка запустит новый."""
+    global _executor
+    with _lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False)
+
+
+def _output_format(image, webp):
+    if webp and features.check('webp'):
+        return 'WEBP'
+    if image.format in ('PNG', 'GIF'):
+        return image.format
+    return 'JPEG'
+
+
+def check_header(image, max_pixels):
+    """Проверяет открытую картинку по заголовку, не декодируя пиксели."""
+    width, height = image.size
+    if width * height > max_pixels:
+        raise ImageRejected(
+            f'Слишком большая картинка: {width}×{height} пикселей.'
+        )
+    if image.format not in FORMATS:
+        raise ImageRejected('Неподдерживаемый формат картинки.')
+
+
+def process_file(source, target, max_side, max_pixels, webp, quality):
+    """Обрабатывает картинку source в target, возвращает её формат.
+
+    Выполняется в дочернем процессе, поэтому работает только с путями
+    и простыми значениями.
+    """
+    with Image.open(source) as image:
+        check_header(image, max_pixels)
+        if getattr(image, 'is_animated', False):
+            # Анимацию не пережимаем, чтобы не потерять кадры.
+            shutil.copyfile(source, target)
+            return image.format
+        output_format = _output_format(image, webp)
+        # JPEG декодируется сразу в уменьшенном масштабе.
+        image.draft('RGB', (max_side, max_side))
+        icc_profile = image.info.get('icc_profile')
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        if output_format == 'JPEG' and image.mode != 'RGB':
+            image = image.convert('RGB')
+        options = {'quality': quality} if output_format != 'GIF' else {}
+        if output_format == 'JPEG':
+            options.update(optimize=True, progressive=True)
+        if icc_profile:
+            options['icc_profile'] = icc_profile
+        # exif_transpose() оставляет EXIF в info, а PNG-кодировщик берёт
+        # его оттуда: пустой exif не даёт записать метаданные.
+        image.save(target, output_format, exif=b'', **options)
+        return output_format
+
+
+def _temporary_path():
+    handle, path = tempfile.mkstemp(suffix='.upload',
+                                    dir=settings.FILE_UPLOAD_TEMP_DIR)
+    os.close(handle)
+    return path
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class ProcessedImage(UploadedFile):
+    """Обработанная картинка во временном файле.
+
+    FileSystemStorage переносит её в MEDIA_ROOT через
+    temporary_file_path() без копирования; если файл так и не сохранили,
+    он удаляется вместе с объектом.
+    """
+
+    def __init__(self, path, name, content_type):
+        super().__init__(open(path, 'rb'), name, content_type,
+                         os.path.getsize(path))
+        self._path = path
+        weakref.finalize(self, _remove, path)
+
+    def temporary_file_path(self):
+        return self._path
+
+
+def check(upload):
+    """Проверяет загруженный файл в запросе; обработка — в process."""
+    if upload.size > settings.UPLOAD_MAX_BYTES:
+        raise ImageRejected('Файл картинки слишком большой.')
+    upload.seek(0)
+    with Image.open(upload) as image:
+        check_header(image, settings.UPLOAD_MAX_PIXELS)
+    upload.seek(0)
+    return upload
+
+
+def process(source, name):
+    """Обработанная копия сохранённой картинки source для ImageField.
+
+    Вызывается из фонового потока: ожидание пула не держит запрос.
+    """
+    target = _temporary_path()
+    try:
+        args = (source, target,
+                settings.UPLOAD_MAX_SIDE, settings.UPLOAD_MAX_PIXELS,
+                settings.UPLOAD_WEBP, settings.UPLOAD_QUALITY)
+        # Демоническому процессу (например, воркеру test --parallel)
+        # запрещено запускать дочерние процессы.
+        if (settings.UPLOAD_WORKERS
+                and not multiprocessing.current_process().daemon):
+            executor = get_executor()
+            try:
+                output_format = executor.submit(process_file, *args).result()
+            except BrokenProcessPool:
+                # Процесс убит (например, по нехватке памяти): без замены
+                # пул отклонял бы все следующие картинки.
+                reset_executor(executor)
+                raise ProcessingFailed('Пул обработки картинок упал.')
+        else:
+            output_format = process_file(*args)
+    except Exception:
+        _remove(target)
+        raise
+    stem = os.path.splitext(os.path.basename(name))[0]
+    extension, content_type = FORMATS[output_format]
+    return ProcessedImage(target, f'{stem}.{extension}', content_type)
@@ -1,8 +1,220 @@
+import base64
+import binascii
+import hashlib
+
 from django.conf import settings
 from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from core import swr
+from core.cache_tags import tags_version
+
+
+def encode_cursor(post, fields=('created', 'pk')):
+    """Кодирует позицию поста (created, id) в непрозрачный токен."""
+    created, pk = (getattr(post, field) for field in fields)
+    raw = f'{created.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Возвращает пару (created, id) или None для битого токена."""
+    if not token:
+        return None
+    try:
+        padding = '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(token + padding).decode()
+        created, pk = raw.rsplit('|', 1)
+        created = parse_datetime(created)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if created is None:
+        return None
+    return created, pk
+
+
+def chunked(values, size=500):
+    """Списки по size значений: столько параметров уходит в один IN."""
+    values = sorted(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+ELLIPSIS = '…'
+
+
+def get_elided_page_range(number, num_pages, on_each_side=3, on_ends=2):
+    """Номера страниц вокруг текущей плюс первые и последние.
+
+    Пропуски обозначаются ELLIPSIS, так что длина результата не зависит
+    от общего числа страниц.
+    """
+    if num_pages <= (on_each_side + on_ends) * 2:
+        yield from range(1, num_pages + 1)
+        return
+
+    if number > 1 + on_each_side + on_ends + 1:
+        yield from range(1, on_ends + 1)
+        yield ELLIPSIS
+        yield from range(number - on_each_side, number + 1)
+    else:
+        yield from range(1, number + 1)
+
+    if number < num_pages - on_each_side - on_ends - 1:
+        yield from range(number + 1, number + on_each_side + 1)
+        yield ELLIPSIS
+        yield from range(num_pages - on_ends + 1, num_pages + 1)
+    else:
+        yield from range(number + 1, num_pages + 1)
+
+
+class CountedPaginator(Paginator):
+    """Paginator, берущий число объектов из FeedCounter, а не COUNT(*)."""
+
+    ELLIPSIS = ELLIPSIS
+
+    def __init__(self, object_list, per_page, counter=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.counter = counter
+
+    @cached_property
+    def count(self):
+        if self.counter is None:
+            return super().count
+        return self.counter.get()
+
+    def get_elided_page_range(self, number=1, on_each_side=3, on_ends=2):
+        number = self.validate_number(number)
+        return get_elided_page_range(number, self.num_pages,
+                                     on_each_side, on_ends)
+
+    def page(self, number):
+        page = super().page(number)
+        page.elided_page_range = list(
+            self.get_elided_page_range(page.number)
+        )
+        return page
+
+
+class BoundedCountPaginator(CountedPaginator):
+    """Paginator для админки: считает не больше max_count строк.
+
+    Без counter вместо COUNT(*) по всей выборке выполняется COUNT по
+    подзапросу с LIMIT, поэтому страницы дальше max_count недоступны,
+    зато фильтр по миллионам строк не сканирует таблицу целиком.
+    """
+
+    max_count = 10000
+
+    @cached_property
+    def count(self):
+        if self.counter is not None:
+            return self.counter.get()
+        return self.object_list[:self.max_count].count()
+
+
+class CursorPaginator(CountedPaginator):
+    """Keyset-пагинация по (created, id) без OFFSET.
+
+    Стоимость запроса одинакова для любой глубины ленты: выбирается
+    per_page + 1 строка после (или до) позиции из курсора. По умолчанию
+    новые объекты идут первыми, descending=False задаёт обратный порядок.
+    fields — имена даты и id в выборке, если сортировать нужно не по
+    полям самой модели (например, по аннотациям из связанной таблицы).
+
+    С cache_tags выборка страницы кешируется через core.swr по тексту
+    её SQL: повторный запрос не обращается к базе, пересчитывает
+    страницу один запрос, а при ошибке базы отдаётся устаревшая копия.
+    """
+
+    def __init__(self, object_list, per_page, counter=None,
+                 descending=True, fields=('created', 'pk'),
+                 cache_tags=None, **kwargs):
+        super().__init__(object_list, per_page, counter, **kwargs)
+        self.descending = descending
+        self.fields = fields
+        self.cache_tags = cache_tags
+
+    def _slice(self, position, forward):
+        """per_page + 1 объектов за позицией в направлении обхода."""
+        backwards_in_time = forward == self.descending
+        sign, lookup = ('-', 'lt') if backwards_in_time else ('', 'gt')
+        date_field, id_field = self.fields
+        objects = self.object_list.order_by(f'{sign}{date_field}',
+                                            f'{sign}{id_field}')
+        if position is not None:
+            created, pk = position
+            objects = objects.filter(
+                Q(**{f'{date_field}__{lookup}': created})
+                | Q(**{date_field: created, f'{id_field}__{lookup}': pk})
+            )
+        objects = objects[:self.per_page + 1]
+        if self.cache_tags is None:
+            return list(objects)
+        sql = str(objects.query).encode()
+        return swr.get_or_compute(
+            f'cursor_page:{hashlib.md5(sql).hexdigest()}',
+            tags_version(self.cache_tags),
+            lambda: list(objects),
+            settings.PAGE_CACHE_TIMEOUT,
+        )
+
+    def page_after(self, token=None):
+        position = decode_cursor(token)
+        posts = self._slice(position, forward=True)
+        has_next = len(posts) > self.per_page
+        posts = posts[:self.per_page]
+        return self._cursor_page(
+            posts,
+            has_next=has_next,
+            has_previous=position is not None and bool(posts),
+        )
+
+    def page_before(self, token):
+        position = decode_cursor(token)
+        if position is None:
+            return self.page_after()
+        posts = self._slice(position, forward=False)
+        has_previous = len(posts) > self.per_page
+        posts = posts[:self.per_page][::-1]
+        return self._cursor_page(
+            posts,
+            has_next=True,
+            has_previous=has_previous,
+        )
+
+    def _cursor_page(self, posts, has_next, has_previous):
+        page = self._get_page(posts, 1, self)
+        page.is_cursor = True
+        page.next_cursor = None
+        page.previous_cursor = None
+        if posts and has_next:
+            page.next_cursor = encode_cursor(posts[-1], self.fields)
+        if posts and has_previous:
+            page.previous_cursor = encode_cursor(posts[0], self.fields)
+        return page
+
 
+def get_paginator(posts, request, counter=None, fields=('created', 'pk'),
+                  cache_tags=None):
+    """Страница ленты по параметрам запроса.
 
-def get_paginator(posts, page):
-    paginator = Paginator(posts, settings.PAGE_SIZE)
+    ?after= и ?before= обслуживаются курсорной пагинацией, старые ссылки
+    вида ?page=N продолжают работать через нумерованные страницы.
+    Число постов берётся из counter, если он передан; fields и
+    cache_tags — см. CursorPaginator.
+    """
+    page_number = request.GET.get('page')
+    if page_number is not None:
+        paginator = CountedPaginator(posts, settings.PAGE_SIZE, counter)
+        return paginator.get_page(page_number)
 
-    return paginator.get_page(page)
+    paginator = CursorPaginator(posts, settings.PAGE_SIZE, counter,
+                                fields=fields, cache_tags=cache_tags)
+    before = request.GET.get('before')
+    if before:
+        return paginator.page_before(before)
+    return paginator.page_after(request.GET.get('after'))
@@ -1,72 +1,142 @@
 from http import HTTPStatus
 
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import ValidationError
+from django.db.models import F
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.http import urlencode
+from django.utils.functional import SimpleLazyObject
 
+from core.decorators import tagged_condition
+
+from . import conditional, thumbnails
+from .counters import author_counter, group_counter, index_counter
+from .feed_cache import GROUPS_TAG, INDEX_TAG, author_tag, group_tag, post_tag
 from .forms import CommentForm, PostForm
 from .models import Comment, Follow, Group, Post, User
-from .utils import get_paginator
+from .search import SearchResults
+from .utils import CountedPaginator, CursorPaginator, get_paginator
+
+
+TIMELINE_FIELDS = ('timeline_created', 'timeline_post')
+
+
+def get_comments_page(post_id, after=None):
+    """Страница комментариев поста в порядке написания."""
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author'
+    ).order_by('created', 'pk')
+    paginator = CursorPaginator(comments, settings.COMMENTS_PAGE_SIZE,
+                                descending=False)
+    return paginator.page_after(after)
 
 
+@tagged_condition(conditional.index_tags)
 def index(request):
     template = 'posts/index.html'
     title = "Последние обновления на сайте"
-    post_list = Post.objects.select_related('group').all()
-    page_number = request.GET.get('page')
+    post_list = Post.objects.for_feed()
+    tags = [INDEX_TAG, GROUPS_TAG]
     context = {
-        'page_obj': get_paginator(post_list, page_number),
+        'page_obj': get_paginator(post_list, request, index_counter(),
+                                  cache_tags=tags),
         'title': title,
-        'index': True
+        'index': True,
+        'cache_tags': tags,
+        'cache_timeout': settings.PAGE_CACHE_TIMEOUT,
     }
     return render(request, template, context)
 
 
+@tagged_condition(conditional.group_tags)
 def group_posts(request, slug):
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    post_list = Post.objects.filter(group=group)
-    page_number = request.GET.get('page')
+    post_list = Post.objects.filter(group=group).for_feed()
+    tags = [group_tag(group.slug)]
 
     context = {
         'group': group,
-        'page_obj': get_paginator(post_list, page_number),
+        'page_obj': get_paginator(post_list, request,
+                                  group_counter(group.pk), cache_tags=tags),
+        'cache_tags': tags,
+        'cache_timeout': settings.PAGE_CACHE_TIMEOUT,
     }
     return render(request, template, context)
 
 
+@tagged_condition(conditional.profile_tags)
 def profile(request, username):
-    profile = get_object_or_404(User, username=username)
-    post_list = Post.objects.filter(author=profile)
-    posts_count = post_list.count()
-    page_number = request.GET.get('page')
+    profile = get_object_or_404(User.objects.select_related('stats'),
+                                username=username)
+    post_list = Post.objects.filter(author=profile).for_feed()
+    counter = author_counter(profile.pk)
+    tags = [author_tag(profile.pk), GROUPS_TAG]
     following = False
     if request.user.is_authenticated:
         following = Follow.objects.filter(user=request.user,
                                           author=profile).exists
     context = {
         'profile': profile,
-        'page_obj': get_paginator(post_list, page_number),
-        'posts_count': posts_count,
-        'following': following
+        'page_obj': get_paginator(post_list, request, counter,
+                                  cache_tags=tags),
+        'posts_count': counter.get(),
+        'stats': getattr(profile, 'stats', None),
+        'following': following,
+        'cache_tags': tags,
+        'cache_timeout': settings.PAGE_CACHE_TIMEOUT,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@tagged_condition(conditional.post_detail_tags)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    posts_count = Post.objects.filter(author=post.author).count()
-    comments = Comment.objects.filter(post=post)
+    post = get_object_or_404(Post.objects.for_detail(), pk=post_id)
+    posts_count = author_counter(post.author_id).get()
     context = {
         'post': post,
         'posts_count': posts_count,
         'form': CommentForm(),
-        'comments': comments
+        'comments_page': SimpleLazyObject(
+            lambda: get_comments_page(post.pk)
+        ),
+        'cache_tags': [post_tag(post.pk), author_tag(post.author_id),
+                       GROUPS_TAG],
+        'cache_timeout': settings.PAGE_CACHE_TIMEOUT,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@tagged_condition(conditional.post_detail_tags)
+def post_comments(request, post_id):
+    """Следующая порция комментариев для кнопки «Показать ещё»."""
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    context = {
+        'post': post,
+        'comments_page': SimpleLazyObject(
+            lambda: get_comments_page(post.pk, request.GET.get('after'))
+        ),
+        'cache_tags': [post_tag(post.pk)],
+        'cache_timeout': settings.PAGE_CACHE_TIMEOUT,
+    }
+    return render(request, 'posts/comments.html', context)
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = CountedPaginator(
+        SearchResults(query, Post.objects.for_feed()), settings.PAGE_SIZE
+    )
+    context = {
+        'query': query,
+        'page_obj': paginator.get_page(request.GET.get('page')),
+        'page_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
@@ -74,6 +144,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        thumbnails.schedule(post, uploaded=True)
 
         return redirect('posts:profile', username=post.author)
 
@@ -98,7 +169,9 @@ def post_edit(request, pid):
     )
 
     if form.is_valid():
-        form.save()
+        post = form.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post, uploaded=True)
         return redirect('posts:post_detail', post_id=pid)
 
     context = {
@@ -122,15 +195,26 @@ def add_comment(request, post_id):
 
 
 @login_required
+@tagged_condition(conditional.follow_tags)
 def follow_index(request):
     template = 'posts/follow.html'
     title = "Последние обновления подписок"
-    post_list = Post.objects.filter(author__following__user=request.user)
-    page_number = request.GET.get('page')
+    # Сортировка и курсор — по колонкам TimelineEntry, чтобы страница
+    # читалась одним диапазоном индекса (user, -created, -post).
+    post_list = Post.objects.filter(
+        timeline_entries__user=request.user
+    ).annotate(
+        timeline_created=F('timeline_entries__created'),
+        timeline_post=F('timeline_entries__post'),
+    ).for_feed().order_by('-timeline_created', '-timeline_post')
+    tags = conditional.follow_tags(request)
     context = {
-        'page_obj': get_paginator(post_list, page_number),
+        'page_obj': get_paginator(post_list, request,
+                                  fields=TIMELINE_FIELDS, cache_tags=tags),
         'title': title,
-        'follow': True
+        'follow': True,
+        'cache_tags': tags,
+        'cache_timeout': settings.PAGE_CACHE_TIMEOUT,
     }
     return render(request, template, context)
 
@@ -50,6 +50,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -124,6 +125,34 @@ USE_TZ = True
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Как отдавать медиа (см. core.views.serve_media): None — сам Django,
+# с поддержкой Range; 'X-Accel-Redirect' (nginx) или 'X-Sendfile'
+# (Apache, lighttpd) — передавать отдачу файла веб-серверу.
+MEDIA_SENDFILE = None
+# Внутренний location nginx, который смотрит в MEDIA_ROOT.
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+# Срок кеширования файлов, имя которых не является хешем содержимого.
+MEDIA_MAX_AGE = 60 * 60
+# Картинки, сохранённые меньше этого числа секунд назад, не удаляются
+# даже без ссылок на них: пост с ними может ещё сохраняться.
+MEDIA_GC_GRACE = 60 * 60
+# Потоков, которые заранее режут миниатюры загруженных картинок;
+# 0 — резать сразу в запросе.
+THUMBNAIL_WORKERS = 2
+# Дополнительно резать варианты в WebP, если Pillow его поддерживает.
+THUMBNAIL_WEBP = True
+
+# Обработка загружаемых картинок (см. posts.uploads).
+# Процессов в пуле (spawn); 0 — обрабатывать в фоновом потоке миниатюр.
+UPLOAD_WORKERS = 2
+UPLOAD_MAX_BYTES = 20 * 1024 * 1024
+# Картинки больше этого числа пикселей отклоняются без декодирования.
+UPLOAD_MAX_PIXELS = 40_000_000
+# Длинная сторона сохраняемого оригинала.
+UPLOAD_MAX_SIDE = 2560
+UPLOAD_QUALITY = 85
+# Сохранять оригиналы в WebP, если Pillow собран с его поддержкой.
+UPLOAD_WEBP = False
 
 STATIC_URL = '/static/'
 
@@ -138,6 +167,8 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 PAGE_SIZE = 10
+# Комментариев на странице поста и в одной подгрузке «Показать ещё».
+COMMENTS_PAGE_SIZE = 20
 
 ALLOWED_HOSTS = ['127.0.0.1',
                  'localhost',
@@ -146,8 +177,67 @@ ALLOWED_HOSTS = ['127.0.0.1',
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache_backends.LayeredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'MAX_ENTRIES': 500,
+            'CHECK_INTERVAL': 1,
+            # Раз в пять минут каждый процесс пишет в лог попадания в L1.
+            'STATS_INTERVAL': 5 * 60,
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
 }
 
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.cache_backends': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
+# Тесты пишут кеш во временный каталог, а не в cache.sqlite3 (см.
+# core.test_runner).
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+
+# Счётчики постов в лентах хранятся в кеше (см. posts.counters).
+FEED_COUNT_TIMEOUT = 60 * 60
+FEED_COUNT_APPROXIMATE_FROM = 10000
+
+# Сколько последних постов хранится в ленте подписок (см. posts.timeline);
+# лишние записи удаляет периодически запускаемая команда trim_timelines.
+FOLLOW_TIMELINE_SIZE = 1000
+
+# Фрагменты страниц сбрасываются по тегам (см. core.cache_tags).
+PAGE_CACHE_TIMEOUT = 60 * 60
+# Сколько отдавать устаревший фрагмент, пока его пересчитывает другой
+# запрос, и сколько ждать чужого пересчёта без устаревшей копии.
+PAGE_CACHE_STALE_TIMEOUT = 60 * 60 * 24
+CACHE_FILL_WAIT = 2
+
+# Бюджеты SQL-запросов GET-страниц по именам URL (см. core.query_budget);
+# проверяются, только когда DEBUG включён при запуске.
+QUERY_BUDGETS = {
+    'posts:index': 5,
+    'posts:group_list': 6,
+    'posts:profile': 8,
+    'posts:post_detail': 8,
+    'posts:post_comments': 5,
+    'posts:follow_index': 5,
+    'posts:search': 5,
+    'posts:post_create': 4,
+    'posts:post_edit': 6,
+}
+QUERY_BUDGET_RAISE = False